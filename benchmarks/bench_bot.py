@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import importlib
+
+from benchmarks.fakes import FakeApi, FakeAttachment, FakeGuild, reaction_payload
+from benchmarks.fake_servers import FakeCtftime, FakeGitHub
+
+# Offline benchmarks for the bot's hot paths against local fakes.
+# Run from the repo root: python -m benchmarks.bench_bot --help
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def report(name, count, elapsed, samples=None, extra=""):
+    line = f"{name:<34} n={count:<6} total={elapsed * 1000:9.1f}ms  rate={count / elapsed if elapsed else 0:10.1f}/s"
+    if samples:
+        line += f"  p50={percentile(samples, 0.5) * 1000:7.2f}ms  p95={percentile(samples, 0.95) * 1000:7.2f}ms"
+    print(f"{line}  {extra}".rstrip())
+
+def writeup_text(i):
+    return (
+        "---\n"
+        "Category: web\n"
+        f"Challenge Name: bench-{i}\n"
+        "\n"
+        f"# Solution {i}\n"
+        "Send the payload, read the flag.\n"
+        "```\ncurl http://target/?q=%27%20or%201=1--\n```\n"
+        "---"
+    )
+
+def load_bot(github, ctftime, state_dir):
+    os.environ.update({
+        "STATE_DB_PATH": os.path.join(state_dir, "bench_state.db"),
+        "BANNER_CACHE_DIR": os.path.join(state_dir, "banners"),
+        "GITHUB_API_BASE": github.url,
+        "GITHUB_REPO_OWNER": "bench",
+        "GITHUB_REPO_NAME": "writeups",
+        "GITHUB_PAT": "bench-token",
+        "PARENT_FOLDER": "CTF-writeups",
+        "CTFTIME_API_URL": f"{ctftime.url}/api/v1"
+    })
+    return importlib.import_module("bot")
+
+def wire_guild(bot_module, guild):
+    channels = dict(guild.channels)
+    bot_module.bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+    bot_module.bot.get_channel = lambda channel_id: guild.channels.get(channel_id)
+    for category in guild.categories.values():
+        bot_module.guild_index.categories[category.name] = category
+    for channel in channels.values():
+        bot_module.guild_index.add_channel(channel)
+
+async def bench_on_message(bot_module, guild, channel, count):
+    member = next(iter(guild.members.values()))
+    # ~99% chatter, ~1% commands, like a normal guild channel.
+    messages = [
+        channel.add_history(">bot help" if i % 100 == 0 else f"just chatting {i}", member)
+        for i in range(count)
+    ]
+    guild.api.reset()
+    samples = []
+    start = time.perf_counter()
+    for message in messages:
+        t = time.perf_counter()
+        await bot_module.on_message(message)
+        samples.append(time.perf_counter() - t)
+    report("on_message (99% chatter)", count, time.perf_counter() - start, samples, f"discord_calls={sum(guild.api.calls.values())}")
+
+async def bench_reactions(bot_module, guild, announce, burst):
+    role = await guild.create_role(name="Bench CTF 26")
+    announcement = await announce.send("@everyone Successfully created CTF \"Bench CTF\"!")
+    bot_module.reaction_roles[announcement.id] = (role.id, "Bench CTF")
+    members = list(guild.members.values())[:burst]
+    # Reactions on ordinary chat messages, which should cost nothing.
+    unrelated = [reaction_payload(guild, bot_module.SPAMMING_CHANNEL_ID, announcement.id + 1, member) for member in members]
+    payloads = [reaction_payload(guild, announce.id, announcement.id, member) for member in members]
+    guild.api.reset()
+    samples = []
+
+    async def react(payload):
+        t = time.perf_counter()
+        await bot_module.on_raw_reaction_add(payload)
+        samples.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(react(payload) for payload in unrelated))
+    report("reaction burst (unrelated msg)", burst, time.perf_counter() - start, samples, f"discord_calls={sum(guild.api.calls.values())}")
+    samples.clear()
+    guild.api.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(react(payload) for payload in payloads))
+    report("reaction burst (announcement)", burst, time.perf_counter() - start, samples, f"discord_calls={sum(guild.api.calls.values())}")
+
+async def bench_create(bot_module, guild, ctftime, count):
+    samples = []
+    guild.api.reset()
+    ctftime.reset_counters()
+    start = time.perf_counter()
+    for event_id in range(1, count + 1):
+        event = await bot_module.fetch_event_details(event_id)
+        if event is None:
+            print(f"  event {event_id}: CTFtime fetch failed, skipped")
+            continue
+        t = time.perf_counter()
+        await bot_module.create_channel_and_event(guild, event)
+        samples.append(time.perf_counter() - t)
+    report("create_channel_and_event", count, time.perf_counter() - start, samples,
+           f"discord_calls={sum(guild.api.calls.values())} ctftime_requests={sum(ctftime.requests.values())}")
+
+async def bench_writeups(bot_module, guild, category, github, sizes, history):
+    member = next(iter(guild.members.values()))
+    for size in sizes:
+        channel = guild.add_channel(f"bench-writeups-{size}", category)
+        bot_module.guild_index.add_channel(channel)
+        step = max(1, history // size)
+        written = 0
+        for i in range(history):
+            if written < size and i % step == 0:
+                if written % 10 == 9:
+                    # Every tenth writeup arrives as an .md attachment.
+                    attachment = FakeAttachment(guild.api, f"bench-{written}.md", writeup_text(written).encode())
+                    channel.add_history("", member, [attachment])
+                else:
+                    channel.add_history(writeup_text(written), member)
+                written += 1
+            else:
+                channel.add_history(f"discussion {i}", member)
+        for label, content in (("cold", ">ctf writeup"), ("re-run", ">ctf writeup"), ("full rescan", ">ctf writeup full")):
+            command = channel.add_history(content, member)
+            guild.api.reset()
+            github.reset_counters()
+            start = time.perf_counter()
+            await bot_module.handle_writeup_command(command)
+            elapsed = time.perf_counter() - start
+            report(
+                f"writeups {size} ({label})", size, elapsed,
+                extra=(
+                    f"github_requests={sum(github.requests.values())} throttled={github.throttled} "
+                    f"discord_sends={guild.api.calls.get('send_message', 0)} "
+                    f"discord_edits={guild.api.calls.get('edit_message', 0)} "
+                    f"attachment_reads={guild.api.calls.get('attachment_read', 0)} "
+                    f"history_pages={guild.api.calls.get('history_page', 0)}"
+                )
+            )
+
+async def main(args):
+    github = await FakeGitHub(latency=args.github_latency_ms / 1000, rate_429=args.rate_429).start()
+    ctftime = await FakeCtftime(latency=args.ctftime_latency_ms / 1000, rate_429=args.ctftime_rate_429).start()
+    with tempfile.TemporaryDirectory() as state_dir:
+        bot_module = load_bot(github, ctftime, state_dir)
+        api = FakeApi(latency=args.discord_latency_ms / 1000, page_latency=args.page_latency_ms / 1000)
+        guild = FakeGuild(api, bot_module.SERVER_ID, member_count=max(args.reactions, 10))
+        category = guild.add_category(f"ctf-{bot_module.current_year}")
+        guild.add_category(f"archive-{bot_module.current_year}")
+        spam = guild.add_channel("bot-spam", channel_id=bot_module.SPAMMING_CHANNEL_ID)
+        announce = guild.add_channel("announcements", channel_id=bot_module.CTF_ANNOUNCE_CHANNEL_ID)
+        wire_guild(bot_module, guild)
+        bot_module.FALLBACK_BANNER_URL = f"{ctftime.url}/logo/0.png"
+        print(
+            f"discord={args.discord_latency_ms}ms github={args.github_latency_ms}ms "
+            f"ctftime={args.ctftime_latency_ms}ms github-429-rate={args.rate_429} ctftime-429-rate={args.ctftime_rate_429}"
+        )
+        try:
+            await bench_on_message(bot_module, guild, spam, args.messages)
+            await bench_reactions(bot_module, guild, announce, args.reactions)
+            await bench_create(bot_module, guild, ctftime, args.creates)
+            await bench_writeups(bot_module, guild, category, github, args.sizes, args.history)
+        finally:
+            await bot_module.close_session()
+            await bot_module.http_client.close()
+            await bot_module.scheduler.stop()
+            await github.stop()
+            await ctftime.stop()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the bot's hot paths.")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[10, 100, 1000])
+    parser.add_argument("--history", type=int, default=10_000, help="messages per writeup channel")
+    parser.add_argument("--messages", type=int, default=10_000, help="messages for the on_message benchmark")
+    parser.add_argument("--reactions", type=int, default=200, help="reactions per burst")
+    parser.add_argument("--creates", type=int, default=5, help="number of >ctf create runs")
+    parser.add_argument("--discord-latency-ms", type=float, default=50)
+    parser.add_argument("--page-latency-ms", type=float, default=0, help="extra latency per 100-message history page")
+    parser.add_argument("--github-latency-ms", type=float, default=100)
+    parser.add_argument("--ctftime-latency-ms", type=float, default=100)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of GitHub requests answered with 429")
+    parser.add_argument("--ctftime-rate-429", type=float, default=0.0, help="fraction of CTFtime requests answered with 429")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args(sys.argv[1:])))
@@ -0,0 +1,46 @@
+import asyncio
+import time
+import bot as bot_module
+
+# Run from the repo root: python -m benchmarks.bench_membership
+
+SIZES = [100, 1_000, 10_000, 100_000]
+LOOKUPS = 2_000
+
+class FakeMember:
+    def __init__(self, member_id):
+        self.id = member_id
+
+class FakeGuild:
+    def __init__(self, size):
+        self._members = {member_id: FakeMember(member_id) for member_id in range(size)}
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+async def linear_scan(guild, user):
+    return any(member.id == user.id for member in guild.members)
+
+async def measure(check, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        await check(FakeMember(user_id))
+    return (time.perf_counter() - start) / len(user_ids) * 1e6
+
+async def main():
+    print(f"{'members':>8} {'linear us/op':>14} {'get_member us/op':>18}")
+    for size in SIZES:
+        guild = FakeGuild(size)
+        bot_module.bot.get_guild = lambda _id, guild=guild: guild
+        # Worst case for the scan: the user is the last cached member.
+        user_ids = [size - 1] * LOOKUPS
+        linear = await measure(lambda user: linear_scan(guild, user), user_ids[:max(1, LOOKUPS * 100 // size)])
+        indexed = await measure(bot_module.is_member_of_guild, user_ids)
+        print(f"{size:>8} {linear:>14.2f} {indexed:>18.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
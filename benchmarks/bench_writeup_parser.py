@@ -0,0 +1,256 @@
+import re
+import sys
+import time
+import random
+import argparse
+
+from services.writeup_parser import Writeup, looks_like_writeup, normalize_name, parse_writeups
+
+# Fuzz and benchmark services.writeup_parser without Discord or GitHub.
+# Run from the repo root: python -m benchmarks.bench_writeup_parser --help
+#
+# The fuzzer builds messages from known pieces (writeups, chatter, fenced
+# examples, broken blocks) so every generated message comes with the output
+# the parser has to produce. The benchmark compares the parser with the
+# line-by-line parser it replaced over a synthetic channel archive.
+
+WORDS = ["flag", "payload", "heap", "rop", "xor", "leak", "admin", "token", "shell", "rsa", "sqli", "jwt", "cookie"]
+CATEGORIES = ["web", "pwn", "crypto", "rev", "forensics", "misc", "OSINT", "Web Exploitation", "re/vm"]
+# A single parse of a hostile message must finish well within this. Messages
+# that make a regex backtrack take seconds or never finish.
+PARSE_TIME_LIMIT = 0.25
+
+def legacy_parse_writeup(text):
+    lines = text.strip().split("\n")
+    if len(lines) < 4 or not lines[0].startswith("---") or not lines[-1].endswith("---"):
+        return None
+    category = None
+    challenge_name = None
+    content_start_index = None
+    for i, line in enumerate(lines[1:-1]):
+        if line.startswith("Category:"):
+            category = line.split("Category:")[1].strip()
+        elif line.startswith("Challenge Name:"):
+            challenge_name = line.split("Challenge Name:")[1].strip()
+        elif line.strip() == "":
+            content_start_index = i + 2
+            break
+    if not category or not challenge_name or content_start_index is None:
+        raise ValueError("Missing required fields (Category or Challenge Name)")
+    return re.sub(r'[^a-z0-9]', '', category.lower()), re.sub(r'[^a-z0-9]', '', challenge_name.lower()), "\n".join(lines[content_start_index:-1])
+
+def sentence(rng, words=6):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, words)))
+
+def fenced(rng):
+    marker = rng.choice(["```", "~~~"])
+    inner = [rng.choice(["---", "-----", "Category: fake", "Challenge Name: fake", "", sentence(rng)]) for _ in range(rng.randint(1, 6))]
+    return [marker + rng.choice(["", "python", "md"])] + inner + [marker]
+
+def body_lines(rng, allow_rule):
+    lines = []
+    for _ in range(rng.randint(1, 8)):
+        kind = rng.random()
+        if kind < 0.25:
+            lines += fenced(rng)
+        elif kind < 0.35:
+            lines.append("")
+        elif kind < 0.45 and allow_rule:
+            # A markdown horizontal rule, followed by something that is not a header.
+            lines += ["---", sentence(rng)]
+        elif kind < 0.55:
+            lines.append(f"- {sentence(rng)}")
+        else:
+            lines.append(sentence(rng, 12))
+    if lines[-1] == "---":
+        lines.append(sentence(rng))
+    return lines
+
+def challenge_name(rng, i):
+    return rng.choice(["Baby ", "the-", "", "Mega_"]) + rng.choice(WORDS) + f" {i}" + rng.choice(["", "!", " ???"])
+
+def random_message(rng):
+    # Returns (text, expected_writeups, expected_error_lines).
+    lines = []
+    writeups = []
+    error_lines = []
+    shared = rng.random() < 0.3
+    closed = True
+    for i in range(rng.randint(1, 4)):
+        for _ in range(rng.randint(0, 2)):
+            if not closed:
+                break
+            lines += fenced(rng) if rng.random() < 0.3 else [sentence(rng, 10)]
+        if closed:
+            lines.append("---")
+        # 1-based line of this block's opening `---`, which may be shared.
+        start = len(lines)
+        category = rng.choice(CATEGORIES)
+        name = challenge_name(rng, i)
+        broken = rng.choice([None] * 12 + ["no category", "blank category", "no blank line"])
+        header = [f"Category: {category}", f"Challenge Name: {name}"]
+        rng.shuffle(header)
+        if rng.random() < 0.2:
+            header.insert(rng.randint(0, len(header)), f"Author: {sentence(rng, 2)}")
+        body = body_lines(rng, allow_rule=not shared)
+        if broken == "no category":
+            header = [line for line in header if not line.startswith("Category")]
+            error_lines.append(start)
+        elif broken == "blank category":
+            header = ["Category:" + whitespace(rng, 20) if line.startswith("Category") else line for line in header]
+            error_lines.append(start)
+        elif broken == "no blank line":
+            # The header runs straight into a code block.
+            body = fenced(rng) + body
+            error_lines.append(start + len(header) + 1)
+        lines += header + ([] if broken == "no blank line" else [""]) + body + ["---"]
+        closed = not shared
+        if not broken:
+            writeups.append(Writeup(normalize_name(category), normalize_name(name), "\n".join(body)))
+    if rng.random() < 0.3:
+        lines += [sentence(rng, 10)]
+    newline = "\r\n" if rng.random() < 0.1 else "\n"
+    return newline.join(lines), writeups, error_lines
+
+def whitespace(rng, longest):
+    return "".join(rng.choice(" \t") for _ in range(rng.randint(0, longest)))
+
+def hostile_message(rng):
+    # Returns (text, bare): whitespace-only field values, header lines repeated
+    # without a blank line and long whitespace runs, the inputs that used to
+    # make the parser's regexes backtrack.
+    field = rng.choice(["Category", "Challenge Name", "challenge \t name"]) + rng.choice(["", " ", "\t"]) + ":"
+    kind = rng.choice(["repeated fields", "long run", "many blocks"])
+    if kind == "repeated fields":
+        lines = [field + whitespace(rng, 30) for _ in range(rng.randint(10, 200))]
+    elif kind == "long run":
+        lines = [field + whitespace(rng, 1) * rng.randint(1_000, 65_536)]
+    else:
+        lines = ["---", field + whitespace(rng, 30)] * rng.randint(10, 2_000)
+    if rng.random() < 0.5:
+        lines.insert(0, rng.choice(["---", "hi\n---"]))
+    return "\n".join(lines) + rng.choice(["", "\n", "x", "\n---"]), rng.random() < 0.3
+
+def random_attachment(rng):
+    category = rng.choice(CATEGORIES)
+    name = challenge_name(rng, 0)
+    body = body_lines(rng, allow_rule=True)
+    text = "\n".join([f"Category: {category}", f"Challenge Name: {name}", ""] + body) + "\n"
+    # Trailing blank lines of a file are not part of the writeup.
+    return text, [Writeup(normalize_name(category), normalize_name(name), "\n".join(body).rstrip())]
+
+def fuzz(iterations, seed):
+    rng = random.Random(seed)
+    failures = 0
+    for i in range(iterations):
+        if rng.random() < 0.02:
+            text, bare = hostile_message(rng)
+            start = time.perf_counter()
+            parse_writeups(text, bare=bare)
+            elapsed = time.perf_counter() - start
+            if elapsed > PARSE_TIME_LIMIT:
+                failures += 1
+                if failures <= 3:
+                    print(f"SLOW at iteration {i} (seed {seed}): {elapsed:.2f}s for {len(text)} characters\n--- text ---\n{text[:200]!r}\n")
+            continue
+        if rng.random() < 0.1:
+            text, expected = random_attachment(rng)
+            expected_errors = []
+            writeups, errors = parse_writeups(text, bare=True)
+        else:
+            text, expected, expected_errors = random_message(rng)
+            if not looks_like_writeup(text):
+                writeups, errors = [], []
+            else:
+                writeups, errors = parse_writeups(text)
+        if writeups != expected or [error.line for error in errors] != expected_errors:
+            failures += 1
+            if failures <= 3:
+                print(f"MISMATCH at iteration {i} (seed {seed})\n--- text ---\n{text}\n--- expected ---\n{expected} errors at {expected_errors}")
+                print(f"--- got ---\n{writeups} {errors}\n")
+        elif len(expected) == 1 and not expected_errors and text.count("\n---\n") == 0 and "\r" not in text and text.startswith("---"):
+            # Single writeups without inner rules must parse exactly as before.
+            try:
+                legacy = legacy_parse_writeup(text)
+            except ValueError:
+                legacy = None
+            if legacy is not None and Writeup(*legacy) != expected[0]:
+                failures += 1
+                print(f"LEGACY MISMATCH at iteration {i} (seed {seed}): {legacy} != {expected[0]}")
+    print(f"fuzz: {iterations} cases, seed {seed}, {failures} mismatches")
+    return failures
+
+def archive(rng, count, writeup_rate):
+    messages = []
+    for _ in range(count):
+        if rng.random() < writeup_rate:
+            rng_state = random.Random(rng.random())
+            text, _, _ = random_message(rng_state)
+            messages.append(text.replace("\r\n", "\n"))
+        else:
+            messages.append(sentence(rng, 20))
+    return messages
+
+def timed_run(label, count, func, repeat=5):
+    # Best of a few runs, so one noisy run does not decide the comparison.
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{label:<40} n={count:<7} total={elapsed * 1000:9.1f}ms  per-message={elapsed / count * 1e6:8.2f}us")
+    return result
+
+def legacy_scan(messages):
+    found = 0
+    for text in messages:
+        if not (text.startswith("---") and text.endswith("---")):
+            continue
+        try:
+            if legacy_parse_writeup(text) is not None:
+                found += 1
+        except ValueError:
+            pass
+    return found
+
+def scan(messages):
+    found = 0
+    for text in messages:
+        if looks_like_writeup(text):
+            found += len(parse_writeups(text)[0])
+    return found
+
+def benchmark(count, writeup_rate, seed):
+    rng = random.Random(seed)
+    messages = archive(rng, count, writeup_rate)
+    legacy_found = timed_run("legacy parser (archive)", count, lambda: legacy_scan(messages))
+    found = timed_run("writeup_parser (archive)", count, lambda: scan(messages))
+    print(f"  writeups found: legacy={legacy_found} writeup_parser={found}")
+    # The archive numbers are not like for like: the old parser gives up on
+    # anything but one writeup per message. Compare on messages both accept.
+    single = []
+    for _ in range(max(1, count // 20)):
+        body = body_lines(rng, allow_rule=False)
+        single.append("\n".join(["---", f"Category: {rng.choice(CATEGORIES)}", f"Challenge Name: {challenge_name(rng, 0)}", ""] + body + ["---"]))
+    timed_run("legacy parser (single writeups)", len(single), lambda: legacy_scan(single))
+    timed_run("writeup_parser (single writeups)", len(single), lambda: scan(single))
+    big = "---\nCategory: web\nChallenge Name: big\n\n" + "\n".join(sentence(rng, 12) for _ in range(20_000)) + "\n---"
+    timed_run(f"legacy parser ({len(big) // 1024} KiB writeup)", 1, lambda: legacy_parse_writeup(big))
+    timed_run(f"writeup_parser ({len(big) // 1024} KiB writeup)", 1, lambda: parse_writeups(big))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the writeup parser.")
+    parser.add_argument("--fuzz", type=int, default=20_000, help="number of fuzz cases (0 to skip)")
+    parser.add_argument("--messages", type=int, default=50_000, help="archive size for the benchmark (0 to skip)")
+    parser.add_argument("--writeup-rate", type=float, default=0.05, help="fraction of archive messages that are writeups")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the fuzz cases and the archive")
+    return parser.parse_args(argv)
+
+def main(args):
+    failures = fuzz(args.fuzz, args.seed) if args.fuzz else 0
+    if args.messages:
+        benchmark(args.messages, args.writeup_rate, args.seed)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args(sys.argv[1:])))
@@ -0,0 +1,162 @@
+import io
+import random
+import asyncio
+import hashlib
+import itertools
+from aiohttp import web
+from PIL import Image
+
+# Local aiohttp servers that mimic the parts of the CTFtime and GitHub APIs
+# the bot uses. Both can add latency and answer a fraction of requests with
+# 429 + Retry-After.
+
+def chaos_middleware(server):
+    @web.middleware
+    async def chaos(request, handler):
+        server.requests[request.method] = server.requests.get(request.method, 0) + 1
+        if server.latency:
+            await asyncio.sleep(server.latency)
+        if server.rate_429 and random.random() < server.rate_429:
+            server.throttled += 1
+            return web.json_response({"message": "rate limited"}, status=429, headers={"Retry-After": "0"})
+        return await handler(request)
+    return chaos
+
+class FakeServer:
+    def __init__(self, latency=0.0, rate_429=0.0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.requests = {}
+        self.throttled = 0
+        self.runner = None
+        self.url = None
+
+    def routes(self, app):
+        raise NotImplementedError
+
+    def reset_counters(self):
+        self.requests.clear()
+        self.throttled = 0
+
+    async def start(self):
+        app = web.Application(middlewares=[chaos_middleware(self)])
+        self.routes(app)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+def make_logo(seed, size=(1200, 600)):
+    image = Image.new("RGB", size, ((seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256))
+    with io.BytesIO() as image_binary:
+        image.save(image_binary, format="PNG")
+        return image_binary.getvalue()
+
+class FakeCtftime(FakeServer):
+    def __init__(self, events=50, **kwargs):
+        super().__init__(**kwargs)
+        self.event_count = events
+        self._logos = {}
+
+    def event(self, event_id):
+        return {
+            "id": event_id,
+            "title": f"Bench CTF {event_id}",
+            "description": "Synthetic event for benchmarks. " * 10,
+            "start": "2030-01-01T00:00:00+00:00",
+            "finish": "2030-01-03T00:00:00+00:00",
+            "duration": {"days": 2, "hours": 0},
+            "weight": 25.0,
+            "format": "Jeopardy",
+            "url": f"https://example.com/{event_id}",
+            "logo": f"{self.url}/logo/{event_id}.png"
+        }
+
+    def routes(self, app):
+        app.router.add_get("/api/v1/events/", self.list_events)
+        app.router.add_get("/api/v1/events/{event_id}/", self.get_event)
+        app.router.add_get("/logo/{event_id}.png", self.get_logo)
+
+    async def list_events(self, request):
+        limit = int(request.query.get("limit", 5))
+        return web.json_response([self.event(i) for i in range(1, min(limit, self.event_count) + 1)])
+
+    async def get_event(self, request):
+        return web.json_response(self.event(int(request.match_info["event_id"])))
+
+    async def get_logo(self, request):
+        event_id = int(request.match_info["event_id"])
+        if event_id not in self._logos:
+            self._logos[event_id] = make_logo(event_id)
+        return web.Response(body=self._logos[event_id], content_type="image/png", headers={"ETag": f'"{event_id}"'})
+
+def git_blob_sha(content):
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+class FakeGitHub(FakeServer):
+    # Just enough of the contents and Git Data APIs for a writeup run.
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.files = {}
+        self.head = "commit-0"
+        self.commits = {"commit-0": {}}
+        self.trees = {}
+        self.blobs = {}
+        self._ids = itertools.count(1)
+
+    def routes(self, app):
+        app.router.add_get("/repos/{owner}/{repo}/contents/{path:.*}", self.get_contents)
+        app.router.add_get("/repos/{owner}/{repo}/git/refs/heads/{branch}", self.get_ref)
+        app.router.add_patch("/repos/{owner}/{repo}/git/refs/heads/{branch}", self.update_ref)
+        app.router.add_get("/repos/{owner}/{repo}/git/commits/{sha}", self.get_commit)
+        app.router.add_post("/repos/{owner}/{repo}/git/blobs", self.create_blob)
+        app.router.add_post("/repos/{owner}/{repo}/git/trees", self.create_tree)
+        app.router.add_post("/repos/{owner}/{repo}/git/commits", self.create_commit)
+
+    async def get_contents(self, request):
+        folder = request.match_info["path"].rstrip("/")
+        entries = [
+            {"type": "file", "path": path, "sha": git_blob_sha(content)}
+            for path, content in self.files.items()
+            if path.rsplit("/", 1)[0] == folder
+        ]
+        if not entries:
+            return web.json_response({"message": "Not Found"}, status=404)
+        return web.json_response(entries)
+
+    async def get_ref(self, request):
+        return web.json_response({"object": {"sha": self.head}})
+
+    async def get_commit(self, request):
+        return web.json_response({"sha": request.match_info["sha"], "tree": {"sha": f"tree-of-{request.match_info['sha']}"}})
+
+    async def create_blob(self, request):
+        body = await request.json()
+        blob_sha = git_blob_sha(body["content"])
+        self.blobs[blob_sha] = body["content"]
+        return web.json_response({"sha": blob_sha}, status=201)
+
+    async def create_tree(self, request):
+        body = await request.json()
+        tree_sha = f"tree-{next(self._ids)}"
+        self.trees[tree_sha] = {entry["path"]: self.blobs[entry["sha"]] for entry in body["tree"]}
+        return web.json_response({"sha": tree_sha}, status=201)
+
+    async def create_commit(self, request):
+        body = await request.json()
+        commit_sha = f"commit-{next(self._ids)}"
+        self.commits[commit_sha] = self.trees[body["tree"]]
+        return web.json_response({"sha": commit_sha}, status=201)
+
+    async def update_ref(self, request):
+        body = await request.json()
+        self.head = body["sha"]
+        self.files.update(self.commits[self.head])
+        return web.json_response({"object": {"sha": self.head}})
@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+# Minimal in-memory stand-ins for the discord.py objects the bot touches.
+# Every call that would be a REST request goes through FakeApi.call, which
+# counts it and sleeps for the configured latency.
+
+class FakeApi:
+    def __init__(self, latency=0.0, page_latency=0.0):
+        self.latency = latency
+        self.page_latency = page_latency
+        self.calls = {}
+        self._ids = itertools.count(1_000_000)
+
+    def next_id(self):
+        return next(self._ids)
+
+    async def call(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def reset(self):
+        self.calls.clear()
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+class FakeMember:
+    def __init__(self, api, member_id, name=None, administrator=True):
+        self.api = api
+        self.id = member_id
+        self.name = name or f"user{member_id}"
+        self.bot = False
+        self.mention = f"<@{member_id}>"
+        self.guild_permissions = SimpleNamespace(administrator=administrator)
+        self.roles = []
+
+    async def add_roles(self, *roles):
+        await self.api.call("add_roles")
+        self.roles.extend(roles)
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call("dm_send")
+
+class FakeAttachment:
+    def __init__(self, api, filename, data):
+        self.api = api
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+
+    async def read(self):
+        await self.api.call("attachment_read")
+        return self.data
+
+class FakeMessage:
+    def __init__(self, api, message_id, content, author, channel, attachments=()):
+        self.api = api
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = list(attachments)
+
+    @property
+    def jump_url(self):
+        return f"https://discord.com/channels/{self.guild.id}/{self.channel.id}/{self.id}"
+
+    async def edit(self, **kwargs):
+        await self.api.call("edit_message")
+        if "content" in kwargs:
+            self.content = kwargs["content"]
+
+    async def add_reaction(self, emoji):
+        await self.api.call("add_reaction")
+
+class FakeCategory:
+    def __init__(self, category_id, name, guild):
+        self.id = category_id
+        self.name = name
+        self.guild = guild
+        self.channels = []
+
+class FakeChannel:
+    def __init__(self, api, channel_id, name, guild, category=None):
+        self.api = api
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.category = category
+        self.messages = []
+
+    def add_history(self, content, author, attachments=()):
+        message = FakeMessage(self.api, self.api.next_id(), content, author, self, attachments)
+        self.messages.append(message)
+        return message
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call("send_message")
+        return self.add_history(content or "", self.guild.me)
+
+    async def edit(self, category=None, **kwargs):
+        await self.api.call("edit_channel")
+        self.category = category
+
+    async def history(self, limit=100, after=None, oldest_first=None):
+        # Pages of 100 like the real client, newest first unless asked otherwise.
+        messages = self.messages
+        if after is not None:
+            messages = [message for message in messages if message.id > after.id]
+        if oldest_first is None:
+            oldest_first = after is not None
+        if not oldest_first:
+            messages = messages[::-1]
+        if limit is not None:
+            messages = messages[:limit]
+        for i, message in enumerate(messages):
+            if i % 100 == 0:
+                await self.api.call("history_page")
+                if self.api.page_latency:
+                    await asyncio.sleep(self.api.page_latency)
+            yield message
+
+class FakeGuild:
+    def __init__(self, api, guild_id, member_count=0):
+        self.api = api
+        self.id = guild_id
+        self.default_role = FakeRole(guild_id, "@everyone")
+        self.me = FakeMember(api, 1, "bot")
+        self.me.bot = True
+        self.members = {member_id: FakeMember(api, member_id) for member_id in range(2, member_count + 2)}
+        self.roles = {}
+        self.channels = {}
+        self.categories = {}
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def add_category(self, name):
+        category = FakeCategory(self.api.next_id(), name, self)
+        self.categories[category.id] = category
+        return category
+
+    def add_channel(self, name, category=None, channel_id=None):
+        channel = FakeChannel(self.api, channel_id or self.api.next_id(), name, self, category)
+        self.channels[channel.id] = channel
+        if category is not None:
+            category.channels.append(channel)
+        return channel
+
+    async def create_role(self, name, **kwargs):
+        await self.api.call("create_role")
+        role = FakeRole(self.api.next_id(), name)
+        self.roles[role.id] = role
+        return role
+
+    async def create_category(self, name, **kwargs):
+        await self.api.call("create_category")
+        return self.add_category(name)
+
+    async def create_text_channel(self, name, category=None, **kwargs):
+        await self.api.call("create_channel")
+        return self.add_channel(name, category)
+
+    async def create_scheduled_event(self, **kwargs):
+        await self.api.call("create_scheduled_event")
+        return SimpleNamespace(id=self.api.next_id(), **kwargs)
+
+def reaction_payload(guild, channel_id, message_id, member):
+    return SimpleNamespace(
+        emoji=SimpleNamespace(name="👍"),
+        guild_id=guild.id,
+        channel_id=channel_id,
+        message_id=message_id,
+        user_id=member.id,
+        member=member
+    )
@@ -1,24 +1,26 @@
 import discord
 from discord.ext import commands
 from datetime import datetime, timedelta
-import io
-import aiohttp
+from collections import OrderedDict
 import asyncio
 import pytz
-from PIL import Image
 import random
+import time
 import os
-import requests
-import base64
-import re
 from services.to_github import *
+from services.bot_state import *
+from services.http_client import CachedHttpClient
+from services.images import load_banner
+from services.progress import ProgressMessage
+from services.jobs import JobQueue
+from services.scheduler import Scheduler
+from services.guild_index import GuildIndex
+from services.metrics import metrics, start_metrics_server
+from services.writeup_parser import looks_like_writeup, parse_writeups
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def normalize_name(text):
-    return re.sub(r'[^a-z0-9]', '', text.lower())
-
 intents = discord.Intents.default()
 intents.messages = True
 intents.message_content = True
@@ -26,16 +28,48 @@ intents.dm_messages = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='>', intents=intents)
+COMMAND_PREFIX = '>'
+bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+guild_commands = {}
+dm_commands = {}
 
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+CTFTIME_API_URL = os.getenv("CTFTIME_API_URL", "https://ctftime.org/api/v1")
 SPAMMING_CHANNEL_ID = 1250850841385238599
 SERVER_ID = 1250679106899673121
 CTF_HELPME_CHANNEL_ID = 1251857136804302969
 CTF_ANNOUNCE_CHANNEL_ID = 1251192205381472296
-CHECK_INTERVAL = 24 * 60 * 60
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+AUTO_ARCHIVE_DELAY = timedelta(days=1)
+WRITEUP_QUEUE_SIZE = 100
+WRITEUP_ATTACHMENT_MAX_BYTES = 1024 * 1024
+PROGRESS_EDIT_INTERVAL = 2
+JOB_WORKERS = 2
+EVENT_CACHE_TTL = 5 * 60
+UPCOMING_CACHE_TTL = 60
+UPCOMING_FETCH_LIMIT = 50
+UPCOMING_REFRESH_INTERVAL = 10 * 60
+UPCOMING_PAGE_SIZE = 5
+UPCOMING_VIEW_TIMEOUT = 5 * 60
+NON_MEMBER_CACHE_TTL = 60
+NON_MEMBER_CACHE_SIZE = 1000
+FALLBACK_BANNER_URL = "https://raw.githubusercontent.com/vicevirus/front-end-ctf-sharing-materials/main/ctf_event.png"
+
+http_client = CachedHttpClient(headers={"User-Agent": "REU1N0N-discord-bot"})
+jobs = JobQueue(workers=JOB_WORKERS)
 
-current_year = datetime.now().year
+non_member_cache = OrderedDict()
+reaction_roles = load_reaction_roles()
+unindexed_messages = set()
+fallback_banner = None
+upcoming_events = []
+upcoming_updated_at = None
+scheduler = Scheduler()
+guild_index = GuildIndex(SERVER_ID)
+metrics_runner = None
+
+current_year = datetime.now(MYT).year
 current_year_short = str(current_year)[-2:]
 
 async def send_anonymous_message(channel_id, formatted_message, dm_channel):
@@ -46,26 +80,43 @@ async def send_anonymous_message(channel_id, formatted_message, dm_channel):
 
 async def is_member_of_guild(user):
     guild = bot.get_guild(SERVER_ID)
-    return any(member.id == user.id for member in guild.members)
+    if guild and guild.get_member(user.id):
+        return True
+    now = time.monotonic()
+    if non_member_cache.get(user.id, 0) > now:
+        return False
+    # The member cache can miss users (or not exist yet before on_ready), so
+    # fall back to the API and remember misses for a short while.
+    try:
+        guild = guild or await bot.fetch_guild(SERVER_ID)
+        await guild.fetch_member(user.id)
+        return True
+    except discord.NotFound:
+        non_member_cache.pop(user.id, None)
+        non_member_cache[user.id] = now + NON_MEMBER_CACHE_TTL
+        # Every entry gets the same TTL, so the oldest entries expire first.
+        while len(non_member_cache) > NON_MEMBER_CACHE_SIZE or next(iter(non_member_cache.values())) <= now:
+            non_member_cache.popitem(last=False)
+        return False
+    except discord.HTTPException as e:
+        print(f"Failed to check guild membership for {user}: {e}")
+        return False
 
 def convert_to_myt(utc_time_str):
     utc_time = datetime.fromisoformat(utc_time_str.replace('Z', '+00:00'))
-    return utc_time.astimezone(pytz.timezone('Asia/Kuala_Lumpur')).isoformat()
+    return utc_time.astimezone(MYT).isoformat()
 
 async def fetch_event_details(event_id):
-    url = f'https://ctftime.org/api/v1/events/{event_id}/'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.json() if response.status == 200 else None
-
-async def fetch_image(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return Image.open(io.BytesIO(await response.read())) if response.status == 200 else None
+    url = f'{CTFTIME_API_URL}/events/{event_id}/'
+    return await http_client.get_json(url, ttl=EVENT_CACHE_TTL)
 
 async def create_category_if_not_exists(guild, category_name):
-    category = discord.utils.get(guild.categories, name=category_name)
-    return category or await guild.create_category(category_name)
+    async with guild_index.lock(('category', category_name)):
+        category = guild_index.category(category_name)
+        if category is None:
+            category = await guild.create_category(category_name)
+            guild_index.add_channel(category)
+        return category
 
 async def move_channel_to_archive(channel):
     global current_year
@@ -74,27 +125,131 @@ async def move_channel_to_archive(channel):
     print(f"Moved channel {channel.name} to {archive_category.name}")
 
 async def fetch_upcoming_events():
-    start = int(datetime.now().timestamp())
-    end = int((datetime.now() + timedelta(weeks=2)).timestamp())
-    url = f'https://ctftime.org/api/v1/events/?limit=5&start={start}&finish={end}'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.json() if response.status == 200 else None
-
-async def check_yearly_update():
+    # Round the window so repeated calls hit the same cache key.
+    start = int(datetime.now().timestamp()) // UPCOMING_CACHE_TTL * UPCOMING_CACHE_TTL
+    end = start + int(timedelta(weeks=2).total_seconds())
+    url = f'{CTFTIME_API_URL}/events/?limit={UPCOMING_FETCH_LIMIT}&start={start}&finish={end}'
+    return await http_client.get_json(url, ttl=UPCOMING_CACHE_TTL)
+
+async def refresh_upcoming_events():
+    global upcoming_events, upcoming_updated_at
+    events = await fetch_upcoming_events()
+    if events is None:
+        return False
+    seen_event_ids = set()
+    unique_events = []
+    for event in events:
+        if event['id'] not in seen_event_ids:
+            seen_event_ids.add(event['id'])
+            unique_events.append(event)
+    upcoming_events = unique_events
+    upcoming_updated_at = datetime.now(MYT)
+    return True
+
+async def refresh_upcoming_job():
+    try:
+        await refresh_upcoming_events()
+    except Exception as e:
+        print(f"Failed to refresh upcoming events: {str(e)}")
+    scheduler.schedule_at('upcoming-refresh', scheduler.clock() + timedelta(seconds=UPCOMING_REFRESH_INTERVAL), refresh_upcoming_job)
+
+def build_event_embed(event):
+    start_time = convert_to_myt(event['start'])
+    end_time = convert_to_myt(event['finish'])
+    start_time_formatted = datetime.fromisoformat(start_time).strftime('%Y-%m-%d %H:%M:%S MYT')
+    end_time_formatted = datetime.fromisoformat(end_time).strftime('%Y-%m-%d %H:%M:%S MYT')
+    duration = f"{event['duration']['days']}d {event['duration']['hours']}h"
+    event_embed = discord.Embed(
+        title=event['title'],
+        description=(
+            f"**Event ID:** {event['id']}\n"
+            f"**Weight:** {event['weight']}\n"
+            f"**Duration:** {duration}\n"
+            f"**Start Time:** {start_time_formatted}\n"
+            f"**End Time:** {end_time_formatted}\n"
+            f"**Format:** {event['format']}\n"
+            f"**[More Info]({event['url']})**"
+        ),
+        color=random.randint(0, 0xFFFFFF)
+    )
+    if event['logo']:
+        event_embed.set_thumbnail(url=event['logo'])
+    return event_embed
+
+class UpcomingEventsView(discord.ui.View):
+    def __init__(self, events, updated_at):
+        super().__init__(timeout=UPCOMING_VIEW_TIMEOUT)
+        self.events = events
+        self.updated_at = updated_at
+        self.page = 0
+        self.page_count = max(1, -(-len(events) // UPCOMING_PAGE_SIZE))
+        self.message = None
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+
+    def embeds(self):
+        start = self.page * UPCOMING_PAGE_SIZE
+        embeds = [build_event_embed(event) for event in self.events[start:start + UPCOMING_PAGE_SIZE]]
+        embeds[-1].set_footer(text=(
+            f"Page {self.page + 1}/{self.page_count} - {len(self.events)} events in the next 2 weeks. "
+            f"Updated {self.updated_at.strftime('%H:%M MYT')}. For more, check ctftime.org."
+        ))
+        return embeds
+
+    async def show_page(self, interaction, page):
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(embeds=self.embeds(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self.show_page(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self.show_page(interaction, min(self.page_count - 1, self.page + 1))
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+def next_year_boundary(now):
+    return MYT.localize(datetime(now.astimezone(MYT).year + 1, 1, 1))
+
+async def year_rollover():
     global current_year, current_year_short
-    await bot.wait_until_ready()
-    while not bot.is_closed():
-        now = datetime.now()
-        if now.year != current_year:
-            guild = bot.get_guild(SERVER_ID)
-            if guild:
-                current_year = now.year
-                current_year_short = str(current_year)[-2:]
-                await create_category_if_not_exists(guild, f'ctf-{current_year}')
-                await create_category_if_not_exists(guild, f'archive-{current_year}')
-                print(f"Year has changed to {current_year}. Categories updated.")
-        await asyncio.sleep(CHECK_INTERVAL)
+    now = scheduler.clock()
+    year = now.astimezone(MYT).year
+    if year != current_year:
+        current_year = year
+        current_year_short = str(current_year)[-2:]
+        guild = bot.get_guild(SERVER_ID)
+        if guild:
+            await create_category_if_not_exists(guild, f'ctf-{current_year}')
+            await create_category_if_not_exists(guild, f'archive-{current_year}')
+        print(f"Year has changed to {current_year}. Categories updated.")
+    scheduler.schedule_at('year-rollover', next_year_boundary(now), year_rollover)
+
+def schedule_channel_archive(channel_id, archive_at):
+    save_scheduled_archive(channel_id, archive_at)
+    scheduler.schedule_at(('archive', channel_id), archive_at, auto_archive_channel, channel_id)
+
+def cancel_channel_archive(channel_id):
+    scheduler.cancel(('archive', channel_id))
+    delete_scheduled_archive(channel_id)
+
+async def auto_archive_channel(channel_id):
+    delete_scheduled_archive(channel_id)
+    channel = bot.get_channel(channel_id)
+    if channel and channel.category and channel.category.name.startswith('ctf-'):
+        await move_channel_to_archive(channel)
+        await channel.send(f"The CTF has ended, so '{channel.name}' has been moved to the archive.")
 
 async def handle_anonymous_question(message, channel_name=None):
     if channel_name:
@@ -103,46 +258,31 @@ async def handle_anonymous_question(message, channel_name=None):
         question = message.content[len('>ask '):].strip()
     formatted_message = f"**Anon:**\n```markdown\n{question}\n```"
     if channel_name:
-        guild = bot.get_guild(SERVER_ID)
-        channel = discord.utils.get(guild.channels, name=channel_name)
         valid_categories = [f'ctf-{current_year}', f'archive-{current_year}']
-        if not channel or (channel.category and channel.category.name not in valid_categories):
+        channel = guild_index.channel(channel_name, valid_categories)
+        if not channel:
             await message.channel.send(f"Invalid channel '{channel_name}' for this command.")
             return
         await send_anonymous_message(channel.id, formatted_message, message.channel)
     else:
         await send_anonymous_message(CTF_HELPME_CHANNEL_ID, formatted_message, message.channel)
 
-async def create_channel_and_event(guild, event):
-    category_name = f'ctf-{current_year}'
-    channel_name = event['title'].lower().replace(' ', '-')
-    category = await create_category_if_not_exists(guild, category_name)
-    for channel in category.channels:
-        if channel.name == channel_name:
-            return None, f"Cannot create CTF '{event['title']}', duplicate event."
-    role_name = f"{event['title']} {current_year_short}"
-    interested_role = await guild.create_role(
-        name=role_name,
-        colour=discord.Colour(0x0000FF),
-        mentionable=True,
-        reason=f"Role for {event['title']} CTF event"
-    )
-    overwrites = {
-        guild.default_role: discord.PermissionOverwrite(view_channel=False),
-        interested_role: discord.PermissionOverwrite(view_channel=True, send_messages=True)
-        }
-    channel = await guild.create_text_channel(channel_name, category=category, overwrites=overwrites)
+async def get_fallback_banner():
+    global fallback_banner
+    if fallback_banner is None:
+        fallback_banner = await load_banner(http_client, FALLBACK_BANNER_URL)
+    return fallback_banner
+
+async def build_event_banner(event):
+    banner = await load_banner(http_client, event['logo']) if event.get('logo') else None
+    return banner or await get_fallback_banner()
+
+async def create_scheduled_event(guild, event, banner_task):
     start_time_myt, finish_time_myt = convert_to_myt(event['start']), convert_to_myt(event['finish'])
-    image = await fetch_image(event['logo']) if event.get('logo') else None
-    if image is None:
-        image_url = "https://raw.githubusercontent.com/vicevirus/front-end-ctf-sharing-materials/main/ctf_event.png"
-        image = await fetch_image(image_url)
-    with io.BytesIO() as image_binary:
-        image.save(image_binary, format='PNG')
-        image_binary.seek(0)
-        image_bytes = image_binary.read()
     description = event['description'] if len(event['description']) <= 1000 else event['description'][:997] + '...'
-    scheduled_event = await guild.create_scheduled_event(
+    image_bytes = await banner_task
+    extra = {'image': image_bytes} if image_bytes else {}
+    return await guild.create_scheduled_event(
         name=event['title'],
         start_time=datetime.fromisoformat(start_time_myt),
         end_time=datetime.fromisoformat(finish_time_myt),
@@ -150,37 +290,117 @@ async def create_channel_and_event(guild, event):
         entity_type=discord.EntityType.external,
         privacy_level=discord.PrivacyLevel.guild_only,
         location=event['url'],
-        image=image_bytes
+        **extra
     )
+
+async def announce_event(event, interested_role):
     announce_channel = bot.get_channel(CTF_ANNOUNCE_CHANNEL_ID)
     if not announce_channel:
-        return None, None, interested_role
-    
+        return None
     ctf_message = await announce_channel.send(
         f"@everyone Successfully created CTF \"{event['title']}\"! React with 👍 if you're playing or want to access the channel."
     )
+    reaction_roles[ctf_message.id] = (interested_role.id, event['title'])
+    save_reaction_role(ctf_message.id, interested_role.id, event['title'])
     await ctf_message.add_reaction("👍")
+    return ctf_message
+
+async def create_channel_and_event(guild, event):
+    category_name = f'ctf-{current_year}'
+    channel_name = event['title'].lower().replace(' ', '-')
+    category = await create_category_if_not_exists(guild, category_name)
+    # The name is reserved until the new channel is in the index, so two
+    # concurrent creates of the same CTF cannot both pass this check.
+    reservation = ('channel', category_name, channel_name)
+    if guild_index.channel(channel_name, [category_name]) or not guild_index.reserve(reservation):
+        raise ValueError(f"Cannot create CTF '{event['title']}', duplicate event.")
+    try:
+        return await create_event_resources(guild, event, category, channel_name)
+    finally:
+        guild_index.release(reservation)
+
+async def create_event_resources(guild, event, category, channel_name):
+    # The banner only feeds the scheduled event, so fetch and encode it while
+    # the role and channel are being created.
+    banner_task = asyncio.create_task(build_event_banner(event))
+    role_name = f"{event['title']} {current_year_short}"
+    try:
+        interested_role = await guild.create_role(
+            name=role_name,
+            colour=discord.Colour(0x0000FF),
+            mentionable=True,
+            reason=f"Role for {event['title']} CTF event"
+        )
+        guild_index.add_role(interested_role)
+    except Exception:
+        banner_task.cancel()
+        raise
+    overwrites = {
+        guild.default_role: discord.PermissionOverwrite(view_channel=False),
+        interested_role: discord.PermissionOverwrite(view_channel=True, send_messages=True)
+        }
+    channel, scheduled_event = await asyncio.gather(
+        guild.create_text_channel(channel_name, category=category, overwrites=overwrites),
+        create_scheduled_event(guild, event, banner_task),
+        return_exceptions=True
+    )
+    # A channel that was created still gets indexed and archived, even when
+    # the scheduled event failed next to it.
+    if not isinstance(channel, BaseException):
+        guild_index.add_channel(channel)
+        finish_time = datetime.fromisoformat(event['finish'].replace('Z', '+00:00'))
+        schedule_channel_archive(channel.id, finish_time + AUTO_ARCHIVE_DELAY)
+    for result in (channel, scheduled_event):
+        if isinstance(result, BaseException):
+            raise result
+    # The @everyone ping only goes out once the channel and event both exist.
+    ctf_message = await announce_event(event, interested_role)
+    if not ctf_message:
+        return None, None, interested_role
     return channel, ctf_message, interested_role
 
 
 @bot.event
 async def on_raw_reaction_add(payload):
-    if payload.emoji.name == "👍":
-        guild = bot.get_guild(payload.guild_id)
-        if not guild:
-            return
-        member = guild.get_member(payload.user_id)
-        if not member or member.bot:
-            return
-        message = await bot.get_channel(payload.channel_id).fetch_message(payload.message_id)
-        if message.author.id != bot.user.id:
+    if payload.emoji.name != "👍" or payload.guild_id is None:
+        return
+    entry = reaction_roles.get(payload.message_id)
+    if entry is None:
+        entry = await index_legacy_announcement(payload)
+        if entry is None:
             return
-        event_name = message.content.split('"')[1]
-        role_name = f"{event_name} {current_year_short}"
-        role = discord.utils.get(guild.roles, name=role_name)
-        if role:
-            await member.add_roles(role)
-            await member.send(f"You have been granted access to the CTF channel for {event_name}.")
+    guild = bot.get_guild(payload.guild_id)
+    if not guild:
+        return
+    member = payload.member or guild.get_member(payload.user_id)
+    if not member or member.bot:
+        return
+    role_id, event_name = entry
+    role = guild.get_role(role_id)
+    if role:
+        await member.add_roles(role)
+        await member.send(f"You have been granted access to the CTF channel for {event_name}.")
+
+async def index_legacy_announcement(payload):
+    # Announcements made before the index existed are looked up once and then
+    # remembered either way, so only the first reaction on them costs a fetch.
+    if payload.channel_id != CTF_ANNOUNCE_CHANNEL_ID or payload.message_id in unindexed_messages:
+        return None
+    unindexed_messages.add(payload.message_id)
+    guild = bot.get_guild(payload.guild_id)
+    channel = bot.get_channel(payload.channel_id)
+    if not guild or not channel:
+        return None
+    message = await channel.fetch_message(payload.message_id)
+    if message.author.id != bot.user.id or message.content.count('"') < 2:
+        return None
+    event_name = message.content.split('"')[1]
+    role = guild_index.role(f"{event_name} {current_year_short}")
+    if not role:
+        return None
+    reaction_roles[message.id] = (role.id, event_name)
+    save_reaction_role(message.id, role.id, event_name)
+    return reaction_roles[message.id]
 
 async def send_help_message(channel):
     help_message = (
@@ -191,9 +411,9 @@ async def send_help_message(channel):
         ">ctf archive\n"
         "    Move the current CTF channel to the archive category.\n\n"
         ">ctf upcoming\n"
-        "    List upcoming CTF events for the week (shows only the next 5). See ctftime.org for more.\n\n"
-        ">ctf writeup\n"
-        "    Compile and upload writeups to the REU1N0N GitHub repo.\n"
+        "    List upcoming CTF events for the next two weeks, 5 per page. See ctftime.org for more.\n\n"
+        ">ctf writeup [full]\n"
+        "    Compile and upload new writeups to the REU1N0N GitHub repo. Add 'full' to rescan the whole channel.\n\n"
         ">ask <question/idea>\n"
         "    Send an anonymous question or idea to the general anonymous questions channel.\n\n"
         ">ask ctf <ctfchannel_name> <question/idea>\n"
@@ -201,7 +421,11 @@ async def send_help_message(channel):
         ">bot help\n"
         "    Display this help message.\n\n"
         ">bot help writeup\n"
-        "    Show details for the '>ctf writeup' command.\n"
+        "    Show details for the '>ctf writeup' command.\n\n"
+        ">bot stats\n"
+        "    Show command and API latencies, error counts and GitHub rate limit (admins only).\n\n"
+        ">bot jobs [cancel <job_id>]\n"
+        "    List running and recent background jobs. Admins can cancel a job.\n"
         "```"
     )
     await channel.send(help_message)
@@ -225,152 +449,399 @@ async def send_writeup_command(channel):
         "\n"
         "---\n"
         "```\n"
+        "One message can hold several writeups, each between its own `---` lines. "
+        "A `.md` attachment with the same header (the `---` lines are optional there) works too.\n"
     )
     await channel.send(writeup_message)
 
+async def extract_writeups(message):
+    # Writeups from the message text and its .md attachments, plus one error
+    # string per broken block, prefixed with where it was found.
+    writeups = []
+    errors = []
+    if looks_like_writeup(message.content):
+        parsed, failed = parse_writeups(message.content)
+        writeups += parsed
+        errors += [f"line {e.line}: {e.message}" for e in failed]
+    for attachment in message.attachments:
+        if not attachment.filename.lower().endswith(".md"):
+            continue
+        if attachment.size > WRITEUP_ATTACHMENT_MAX_BYTES:
+            errors.append(f"{attachment.filename}: larger than {WRITEUP_ATTACHMENT_MAX_BYTES // 1024} KiB")
+            continue
+        try:
+            data = await attachment.read()
+        except discord.HTTPException as e:
+            errors.append(f"{attachment.filename}: download failed ({e.status})")
+            continue
+        parsed, failed = parse_writeups(data.decode("utf-8", errors="replace"), bare=True)
+        writeups += parsed
+        errors += [f"{attachment.filename} line {e.line}: {e.message}" for e in failed]
+    return writeups, errors
+
+async def publish_writeup_queue(year, ctf, channel_id, queue, results, progress, found):
+    # Blobs are uploaded while the history is still being read; the run then
+    # ends in a single tree and commit, however many writeups it found.
+    existing = None
+    blobs = {}
+    hashes = {}
+    uploads = set()
+
+    async def upload(path, file_content, status):
+        blobs[path] = await create_blob(file_content)
+        results[path] = status
+        progress.update(render_writeup_progress(found(), results))
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            path, file_content = item
+            if existing is None:
+                existing = await list_writeup_blobs(year, ctf)
+            hashes[path] = content_hash(file_content)
+            status = writeup_status(path, file_content, existing)
+            if status == "exist":
+                results[path] = status
+                continue
+            if len(uploads) >= GITHUB_MAX_CONCURRENCY:
+                done, uploads = await asyncio.wait(uploads, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            uploads.add(asyncio.create_task(upload(path, file_content, status)))
+        await asyncio.gather(*uploads)
+    finally:
+        for task in uploads:
+            task.cancel()
+    if blobs:
+        await commit_writeups(ctf, blobs, results)
+    save_writeup_progress(channel_id, None, hashes)
+
+async def enqueue_writeup(queue, item, publisher):
+    put = asyncio.ensure_future(queue.put(item))
+    await asyncio.wait({put, publisher}, return_when=asyncio.FIRST_COMPLETED)
+    if publisher.done() and not put.done():
+        put.cancel()
+        publisher.result()
+
+def render_writeup_progress(found, results):
+    published = sum(1 for a in results.values() if a != "exist")
+    skipped = len(results) - published
+    return f"Processing writeups... {found} found, {published} published, {skipped} unchanged."
+
+def summary_field(lines):
+    # Embed field values are capped at 1024 characters.
+    value = ""
+    for i, line in enumerate(lines):
+        more = f"\n...and {len(lines) - i} more"
+        if len(value) + len(line) + 1 + len(more) > 1024:
+            return value + more
+        value += line + "\n"
+    return value or "None"
+
+def build_writeup_summary(ctf, results, failures):
+    embed = discord.Embed(title=f"Writeup summary for {ctf}", color=random.randint(0, 0xFFFFFF))
+    for label, status in (("Created", "created"), ("Updated", "updated"), ("Skipped (unchanged)", "exist")):
+        paths = [path for path, a in results.items() if a == status]
+        if status == "exist":
+            lines = [f"`{os.path.basename(path)}`" for path in paths]
+        else:
+            lines = [f"[{os.path.basename(path)}]({github_file_url(path)})" for path in paths]
+        embed.add_field(name=f"{label}: {len(paths)}", value=summary_field(lines), inline=False)
+    lines = [f"{mention} [message]({url}): {error}" for mention, url, error in failures]
+    embed.add_field(name=f"Failed: {len(failures)}", value=summary_field(lines), inline=False)
+    return embed
+
+async def handle_writeup_command(message):
+    cat_name = message.channel.category.name if message.channel.category else ""
+    if not (cat_name.startswith("ctf-") or cat_name.startswith("archive-")):
+        await message.channel.send("This command can only be used in a CTF channel.")
+        return
+    ctf = message.channel.name
+    # The MYT year at the start of the run, so a rescan across New Year's
+    # does not split its writeups between two folders.
+    year = current_year
+    full_rescan = message.content.split()[2:3] == ["full"]
+    last_message_id = None if full_rescan else get_last_message_id(message.channel.id)
+    if last_message_id:
+        history = message.channel.history(limit=None, after=discord.Object(id=last_message_id), oldest_first=False)
+    else:
+        history = message.channel.history(limit=None)
+    known_hashes = get_writeup_hashes(message.channel.id)
+    # History is read newest first, so the first copy of a path seen wins.
+    seen_paths = set()
+    results = {}
+    failures = []
+    newest_message_id = None
+    found = 0
+    progress = ProgressMessage(message.channel, interval=PROGRESS_EDIT_INTERVAL)
+    await progress.start("Scanning channel for writeups...")
+    # Messages are parsed page by page and dropped straight away; only parsed
+    # writeups are queued, so the GitHub commits overlap with the Discord fetch.
+    queue = asyncio.Queue(maxsize=WRITEUP_QUEUE_SIZE)
+    publisher = asyncio.create_task(publish_writeup_queue(year, ctf, message.channel.id, queue, results, progress, lambda: found))
+    try:
+        async for writeup_msg in history:
+            if newest_message_id is None:
+                newest_message_id = writeup_msg.id
+            if not writeup_msg.attachments and "---" not in writeup_msg.content:
+                continue
+            writeups, errors = await extract_writeups(writeup_msg)
+            for error in errors:
+                found += 1
+                failures.append((writeup_msg.author.mention, writeup_msg.jump_url, error))
+            for category, challenge_name, content in writeups:
+                found += 1
+                if found % 25 == 0:
+                    progress.update(render_writeup_progress(found, results))
+                path = writeup_path(year, ctf, category, challenge_name)
+                if path in seen_paths:
+                    continue
+                seen_paths.add(path)
+                file_content = writeup_file_content(content, writeup_msg.author.name)
+                if known_hashes.get(path) == content_hash(file_content):
+                    results[path] = "exist"
+                    continue
+                await enqueue_writeup(queue, (path, file_content), publisher)
+        await enqueue_writeup(queue, None, publisher)
+        await publisher
+    except Exception as e:
+        print(f"Error processing writeups in {ctf}: {str(e)}")
+        await progress.finish(f"Failed to process the request after {found} writeup(s): {str(e)}")
+        return
+    finally:
+        publisher.cancel()
+    save_writeup_progress(message.channel.id, newest_message_id, {})
+    if not found:
+        await progress.finish("No new writeup found." if last_message_id else "No writeup found.")
+        return
+    await progress.finish(f"All previous writeup have been processed ({found} found).")
+    mentions = " ".join(dict.fromkeys(mention for mention, _, _ in failures))
+    await message.channel.send(mentions or None, embed=build_writeup_summary(ctf, results, failures))
+
 @bot.event
 async def on_ready():
+    global metrics_runner
     print(f'Logged in as {bot.user}')
     guild = bot.get_guild(SERVER_ID)
     if guild:
+        guild_index.rebuild(guild)
         await create_category_if_not_exists(guild, f'ctf-{current_year}')
         await create_category_if_not_exists(guild, f'archive-{current_year}')
-    bot.loop.create_task(check_yearly_update())
+    await get_fallback_banner()
+    if METRICS_PORT and metrics_runner is None:
+        metrics_runner = await start_metrics_server(metrics, METRICS_PORT)
+    # on_ready fires again after every reconnect; the scheduler only keeps one
+    # runner and one entry per job key, so nothing piles up.
+    scheduler.start()
+    await year_rollover()
+    if not scheduler.is_scheduled('upcoming-refresh'):
+        scheduler.schedule_at('upcoming-refresh', scheduler.clock(), refresh_upcoming_job)
+    for channel_id, archive_at in load_scheduled_archives().items():
+        scheduler.schedule_at(('archive', channel_id), archive_at, auto_archive_channel, channel_id)
 
 @bot.event
-async def on_message(message):
-    # This part is for processing messages via DM
-    if isinstance(message.channel, discord.DMChannel) and message.author != bot.user:
-        if await is_member_of_guild(message.author):
-            if message.content.startswith('>ask ctf '):
-                parts = message.content.split(' ')
-                if len(parts) > 3:
-                    await handle_anonymous_question(message, parts[2])
-                else:
-                    await message.channel.send("Usage: >ask ctf <channel_name> <question>")
-            elif message.content.startswith('>ask '):
-                await handle_anonymous_question(message)
-            elif message.content.startswith('>bot help'):
-                parts = message.content.split()
-                if len(parts) > 2:
-                    if parts[2] == 'writeup':
-                        await send_writeup_command(message.channel)
-                    else:
-                        await send_help_message(message.channel)
-                else:
-                    await send_help_message(message.channel)
+async def on_guild_channel_create(channel):
+    if guild_index.tracks(channel.guild):
+        guild_index.add_channel(channel)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    if guild_index.tracks(channel.guild):
+        guild_index.remove_channel(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if guild_index.tracks(after.guild):
+        guild_index.update_channel(before, after)
+
+@bot.event
+async def on_guild_role_create(role):
+    if guild_index.tracks(role.guild):
+        guild_index.add_role(role)
+
+@bot.event
+async def on_guild_role_delete(role):
+    if guild_index.tracks(role.guild):
+        guild_index.remove_role(role)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if guild_index.tracks(after.guild):
+        guild_index.update_role(before, after)
+
+def instrument_discord_http(http):
+    # Every Discord REST call goes through HTTPClient.request, so timing it
+    # here covers sends, edits, role and channel creation alike. That method
+    # is private to discord.py (checked against 2.x); if a release drops it,
+    # run without the timings rather than fail at startup.
+    request = getattr(http, "request", None)
+    if request is None:
+        print("discord.py HTTPClient has no request method; Discord API calls are not timed")
+        return
+    async def timed_request(route, **kwargs):
+        with metrics.timed(f"discord.{route.method} {route.path}"):
+            return await request(route, **kwargs)
+    http.request = timed_request
+
+def command(name, guild=True, dm=False):
+    def register(handler):
+        if guild:
+            guild_commands[name] = handler
+        if dm:
+            dm_commands[name] = handler
+        return handler
+    return register
+
+def find_command(registry, content):
+    words = content[len(COMMAND_PREFIX):].split(maxsplit=2)
+    if not words:
+        return None
+    return registry.get(" ".join(words[:2])) or registry.get(words[0])
+
+@command('ask', guild=False, dm=True)
+async def ask_command(message):
+    parts = message.content.split(' ')
+    if len(parts) > 1 and parts[1] == 'ctf':
+        if len(parts) > 3:
+            await handle_anonymous_question(message, parts[2])
         else:
-            await message.channel.send("You must be a member of the server to use this command.")
-    # This part is for processing messages via Channel
-    if message.content.startswith('>ctf create ') and message.channel.id == SPAMMING_CHANNEL_ID:
-        event_id = message.content[len('>ctf create '):].strip()
-        event = await fetch_event_details(event_id)
-        if event:
+            await message.channel.send("Usage: >ask ctf <channel_name> <question>")
+    elif message.content[len('>ask '):].strip():
+        await handle_anonymous_question(message)
+    else:
+        await message.channel.send("Usage: >ask <question>")
+
+@command('bot help', dm=True)
+async def help_command(message):
+    parts = message.content.split()
+    if len(parts) > 2 and parts[2] == 'writeup':
+        await send_writeup_command(message.channel)
+    else:
+        await send_help_message(message.channel)
+
+async def run_create_command(message, event_id):
+    event = await fetch_event_details(event_id)
+    if event:
+        try:
             new_channel, ctf_message, interested_role = await create_channel_and_event(message.guild, event)
+        except ValueError as e:
+            await message.channel.send(str(e))
+    else:
+        await message.channel.send("Failed to fetch event data. Please check the event ID.")
+
+async def submit_job(message, key, description, factory):
+    job, created = jobs.submit(key, description, factory)
+    if not created:
+        await message.channel.send(f"`{description}` is already running as job #{job.id}.")
+
+@command('ctf create')
+async def create_command(message):
+    if message.channel.id != SPAMMING_CHANNEL_ID:
+        return
+    parts = message.content.split()
+    if len(parts) < 3 or not parts[2].isdigit():
+        await message.channel.send("Usage: >ctf create <ctftime_event_id>")
+        return
+    event_id = parts[2]
+    await submit_job(message, ('create', event_id), f"ctf create {event_id}", lambda: run_create_command(message, event_id))
+
+@command('ctf archive')
+async def archive_command(message):
+    if message.channel.category and message.channel.category.name == f'ctf-{current_year}':
+        if message.author.guild_permissions.administrator:
+            cancel_channel_archive(message.channel.id)
+            await move_channel_to_archive(message.channel)
+            await message.channel.send(f"Channel '{message.channel.name}' has been moved to the archive.")
         else:
-            await message.channel.send("Failed to fetch event data. Please check the event ID.")
-
-    elif message.content.startswith('>ctf archive'):
-        if message.channel.category and message.channel.category.name == f'ctf-{current_year}':
-            if message.author.guild_permissions.administrator:
-                await move_channel_to_archive(message.channel)
-                await message.channel.send(f"Channel '{message.channel.name}' has been moved to the archive.")
-            else:
-                await message.channel.send("You do not have permission to archive channels.")
-        else:
-            await message.channel.send("This command can only be used in channels within the current year's CTF category.")
-
-    elif message.content.startswith('>ctf upcoming'):
-        events = await fetch_upcoming_events()
-        seen_event_ids = set()
-        if events:
-            embed = discord.Embed(title="Upcoming CTF Events for the Week", color=random.randint(0, 0xFFFFFF))
-            for event in events:
-                if event['id'] in seen_event_ids:
-                    continue
-                seen_event_ids.add(event['id'])
-                start_time = convert_to_myt(event['start'])
-                end_time = convert_to_myt(event['finish'])
-                start_time_formatted = datetime.fromisoformat(start_time).strftime('%Y-%m-%d %H:%M:%S MYT')
-                end_time_formatted = datetime.fromisoformat(end_time).strftime('%Y-%m-%d %H:%M:%S MYT')
-                duration = f"{event['duration']['days']}d {event['duration']['hours']}h"
-                event_embed = discord.Embed(
-                    title=event['title'],
-                    description=(
-                        f"**Event ID:** {event['id']}\n"
-                        f"**Weight:** {event['weight']}\n"
-                        f"**Duration:** {duration}\n"
-                        f"**Start Time:** {start_time_formatted}\n"
-                        f"**End Time:** {end_time_formatted}\n"
-                        f"**Format:** {event['format']}\n"
-                        f"**[More Info]({event['url']})**"
-                    ),
-                    color=random.randint(0, 0xFFFFFF)
-                )
-                if event['logo']:
-                    event_embed.set_thumbnail(url=event['logo'])
-                await message.channel.send(embed=event_embed)
-            embed.set_footer(text="Showing only 5 upcoming CTF events. For more, check ctftime.org.")
+            await message.channel.send("You do not have permission to archive channels.")
+    else:
+        await message.channel.send("This command can only be used in channels within the current year's CTF category.")
+
+@command('ctf upcoming')
+async def upcoming_command(message):
+    # Normally answered from the background refresher; only the first call
+    # after startup may have to wait for CTFtime.
+    if upcoming_updated_at is None:
+        await refresh_upcoming_events()
+    if upcoming_events:
+        view = UpcomingEventsView(upcoming_events, upcoming_updated_at)
+        view.message = await message.channel.send(embeds=view.embeds(), view=view)
+    else:
+        await message.channel.send("No upcoming CTF events found.")
+
+async def run_writeup_command(message):
+    try:
+        await handle_writeup_command(message)
+    except Exception as e:
+        await message.channel.send(f"Failed to process the request: {str(e)}")
+
+@command('ctf writeup')
+async def writeup_command(message):
+    await submit_job(message, ('writeup', message.channel.id), f"ctf writeup #{message.channel.name}", lambda: run_writeup_command(message))
+
+@command('bot stats')
+async def stats_command(message):
+    if not message.author.guild_permissions.administrator:
+        await message.channel.send("You do not have permission to view bot stats.")
+        return
+    lines = [f"{'name':<40} {'calls':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8}"]
+    for name, calls, errors, p50, p95 in metrics.summary():
+        lines.append(f"{name[:40]:<40} {calls:>6} {errors:>6} {p50 * 1000:>8.1f} {p95 * 1000:>8.1f}")
+    rate_limit = metrics.github_rate_limit
+    if rate_limit:
+        reset = datetime.fromtimestamp(rate_limit['reset'], MYT).strftime('%H:%M:%S MYT')
+        lines.append(f"\nGitHub rate limit: {rate_limit['remaining']}/{rate_limit['limit']} remaining, resets {reset}")
+    body = "\n".join(lines)
+    if len(body) > 1900:
+        body = body[:1900] + "\n..."
+    await message.channel.send(f"**Bot stats:**\n```\n{body}\n```")
+
+# Guild-only: job descriptions name channels a DM user may not be able to see.
+@command('bot jobs')
+async def jobs_command(message):
+    parts = message.content.split()
+    if len(parts) > 2 and parts[2] == 'cancel':
+        if not message.author.guild_permissions.administrator:
+            await message.channel.send("You do not have permission to cancel jobs.")
+        elif len(parts) < 4 or not parts[3].lstrip('#').isdigit():
+            await message.channel.send("Usage: >bot jobs cancel <job_id>")
+        elif jobs.cancel(int(parts[3].lstrip('#'))):
+            await message.channel.send(f"Cancelled job #{parts[3].lstrip('#')}.")
         else:
-            await message.channel.send("No upcoming CTF events found.")
+            await message.channel.send(f"No active job #{parts[3].lstrip('#')}.")
+        return
+    lines = [f"#{job.id} {job.status:<9} {job.elapsed():>6.1f}s  {job.description}" for job in jobs.jobs()]
+    await message.channel.send("**Jobs:**\n```\n" + ("\n".join(lines) or "No jobs.") + "\n```")
+
+@bot.event
+async def on_message(message):
+    # Most guild chatter is not a command, so bail out before doing any work.
+    if not message.content.startswith(COMMAND_PREFIX) or message.author.bot:
+        return
+    is_dm = isinstance(message.channel, discord.DMChannel)
+    handler = find_command(dm_commands if is_dm else guild_commands, message.content)
+    if handler is None:
+        return
+    if is_dm and not await is_member_of_guild(message.author):
+        await message.channel.send("You must be a member of the server to use this command.")
+        return
+    with metrics.timed(f"command.{handler.__name__}"):
+        await handler(message)
 
-    elif message.content.startswith(">ctf writeup"):
+async def main():
+    async with bot:
+        instrument_discord_http(bot.http)
         try:
-            cat_name = message.channel.category.name if message.channel.category else ""
-            if not (cat_name.startswith("ctf-") or cat_name.startswith("archive-")):
-                await message.channel.send("This command can only be used in a CTF channel.")
-                return
-            ctf = message.channel.name
-            messages = [msg async for msg in message.channel.history(limit=10000)]
-            writeup_messages = [msg for msg in messages if msg.content.startswith("---") and msg.content.endswith("---")]
-            if not writeup_messages:
-                await message.channel.send("No writeup found.")
-                return
-            for writeup_msg in writeup_messages:
-                try:
-                    lines = writeup_msg.content.strip().split("\n")
-                    if len(lines) < 4 or not lines[0].startswith("---") or not lines[-1].endswith("---"):
-                        continue
-                    category = None
-                    challenge_name = None
-                    content_start_index = None
-                    for i, line in enumerate(lines[1:-1]):
-                        if line.startswith("Category:"):
-                            category = line.split("Category:")[1].strip()
-                        elif line.startswith("Challenge Name:"):
-                            challenge_name = line.split("Challenge Name:")[1].strip()
-                        elif line.strip() == "":
-                            content_start_index = i + 2
-                            break
-                    if not category or not challenge_name or content_start_index is None:
-                        await message.channel.send(f"{writeup_msg.author.mention} Missing required fields (Category or Challenge Name) in message: https://discord.com/channels/{message.guild.id}/{message.channel.id}/{writeup_msg.id}")
-                        continue
-                    category = normalize_name(category)
-                    challenge_name = normalize_name(challenge_name)
-                    content = "\n".join(lines[content_start_index:-1])
-                    sender_username = writeup_msg.author.name
-                    a = create_folder_structure(ctf, category, challenge_name, content, sender_username)
-                    if a == "exist":
-                        await message.channel.send(f"`CTF-writeups/{datetime.now().year}/{ctf}/{category}-{challenge_name}.md` already exists. Skipping...")
-                    elif a == "updated":
-                        await message.channel.send(f"Updating `CTF-writeups/{datetime.now().year}/{ctf}/{category}-{challenge_name}.md`...")
-                    elif a == "created":
-                        await message.channel.send(f"Creating `CTF-writeups/{datetime.now().year}/{ctf}/{category}-{challenge_name}.md`...")
-                except Exception as e:
-                    await message.channel.send(f"{writeup_msg.author.mention} Error processing your writeup in message: https://discord.com/channels/{message.guild.id}/{message.channel.id}/{writeup_msg.id} - {str(e)}")
-                    print(f"Error processing writeup message: {str(e)}")
-            await message.channel.send("All previous writeup have been processed.")
-        except Exception as e:
-            await message.channel.send(f"Failed to process the request: {str(e)}")
-
-    elif message.content.startswith('>bot help'):
-        parts = message.content.split()
-        if len(parts) > 2:
-            if parts[2] == 'writeup':
-                await send_writeup_command(message.channel)
-            else:
-                await send_help_message(message.channel)
-        else:
-            await send_help_message(message.channel)
+            await bot.start(TOKEN)
+        finally:
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await scheduler.stop()
+            await jobs.close()
+            await close_session()
+            await http_client.close()
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    asyncio.run(main())
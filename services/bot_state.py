@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import hashlib
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+
+_connection = None
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(STATE_DB_PATH)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript("""
+            CREATE TABLE IF NOT EXISTS writeup_progress (
+                channel_id INTEGER PRIMARY KEY,
+                last_message_id INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS writeup_hashes (
+                channel_id INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (channel_id, path)
+            );
+            CREATE TABLE IF NOT EXISTS scheduled_archives (
+                channel_id INTEGER PRIMARY KEY,
+                archive_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reaction_roles (
+                message_id INTEGER PRIMARY KEY,
+                role_id INTEGER NOT NULL,
+                event_name TEXT NOT NULL
+            );
+        """)
+    return _connection
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_last_message_id(channel_id):
+    row = get_connection().execute(
+        "SELECT last_message_id FROM writeup_progress WHERE channel_id = ?", (channel_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+def get_writeup_hashes(channel_id):
+    rows = get_connection().execute(
+        "SELECT path, content_hash FROM writeup_hashes WHERE channel_id = ?", (channel_id,)
+    )
+    return dict(rows.fetchall())
+
+def save_writeup_progress(channel_id, last_message_id, hashes):
+    with get_connection() as conn:
+        if last_message_id is not None:
+            conn.execute(
+                "INSERT INTO writeup_progress (channel_id, last_message_id) VALUES (?, ?) "
+                "ON CONFLICT(channel_id) DO UPDATE SET last_message_id = MAX(last_message_id, excluded.last_message_id)",
+                (channel_id, last_message_id)
+            )
+        conn.executemany(
+            "INSERT INTO writeup_hashes (channel_id, path, content_hash) VALUES (?, ?, ?) "
+            "ON CONFLICT(channel_id, path) DO UPDATE SET content_hash = excluded.content_hash",
+            [(channel_id, path, digest) for path, digest in hashes.items()]
+        )
+
+def load_reaction_roles():
+    rows = get_connection().execute("SELECT message_id, role_id, event_name FROM reaction_roles")
+    return {message_id: (role_id, event_name) for message_id, role_id, event_name in rows}
+
+def save_reaction_role(message_id, role_id, event_name):
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT INTO reaction_roles (message_id, role_id, event_name) VALUES (?, ?, ?) "
+            "ON CONFLICT(message_id) DO UPDATE SET role_id = excluded.role_id, event_name = excluded.event_name",
+            (message_id, role_id, event_name)
+        )
+
+def load_scheduled_archives():
+    rows = get_connection().execute("SELECT channel_id, archive_at FROM scheduled_archives")
+    return {channel_id: datetime.fromisoformat(archive_at) for channel_id, archive_at in rows}
+
+def save_scheduled_archive(channel_id, archive_at):
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT INTO scheduled_archives (channel_id, archive_at) VALUES (?, ?) "
+            "ON CONFLICT(channel_id) DO UPDATE SET archive_at = excluded.archive_at",
+            (channel_id, archive_at.isoformat())
+        )
+
+def delete_scheduled_archive(channel_id):
+    with get_connection() as conn:
+        conn.execute("DELETE FROM scheduled_archives WHERE channel_id = ?", (channel_id,))
@@ -0,0 +1,90 @@
+import asyncio
+import discord
+
+class GuildIndex:
+    # Name -> object lookups for one guild's categories, channels and roles.
+    # Filled once from the cache with rebuild() and then kept current from
+    # the gateway channel/role events, so lookups never scan the guild.
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.categories = {}
+        self.channels = {}
+        self.roles = {}
+        self._reserved = set()
+        self._locks = {}
+
+    def rebuild(self, guild):
+        self.categories.clear()
+        self.channels.clear()
+        self.roles.clear()
+        for channel in guild.channels:
+            self.add_channel(channel)
+        for role in guild.roles:
+            self.add_role(role)
+
+    def tracks(self, guild):
+        return guild is not None and guild.id == self.guild_id
+
+    def add_channel(self, channel):
+        if isinstance(channel, discord.CategoryChannel):
+            self.categories[channel.name] = channel
+        else:
+            self.channels.setdefault(channel.name, {})[channel.id] = channel
+
+    def remove_channel(self, channel):
+        if isinstance(channel, discord.CategoryChannel):
+            if self.categories.get(channel.name) is not None and self.categories[channel.name].id == channel.id:
+                del self.categories[channel.name]
+            return
+        by_id = self.channels.get(channel.name)
+        if by_id is not None:
+            by_id.pop(channel.id, None)
+            if not by_id:
+                del self.channels[channel.name]
+
+    def update_channel(self, before, after):
+        self.remove_channel(before)
+        self.add_channel(after)
+
+    def add_role(self, role):
+        self.roles[role.name] = role
+
+    def remove_role(self, role):
+        if self.roles.get(role.name) is not None and self.roles[role.name].id == role.id:
+            del self.roles[role.name]
+
+    def update_role(self, before, after):
+        self.remove_role(before)
+        self.add_role(after)
+
+    def category(self, name):
+        return self.categories.get(name)
+
+    def channel(self, name, category_names=None):
+        # With category_names, only channels under one of those categories
+        # match; the channel's live category is checked, since moves between
+        # categories arrive as updates to the same object.
+        for channel in self.channels.get(name, {}).values():
+            if category_names is None or (channel.category and channel.category.name in category_names):
+                return channel
+        return None
+
+    def role(self, name):
+        return self.roles.get(name)
+
+    def lock(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def reserve(self, key):
+        # Claims a name that is about to be created so a concurrent create of
+        # the same name sees it as taken before the gateway event arrives.
+        if key in self._reserved:
+            return False
+        self._reserved.add(key)
+        return True
+
+    def release(self, key):
+        self._reserved.discard(key)
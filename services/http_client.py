@@ -0,0 +1,98 @@
+import time
+import asyncio
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import aiohttp
+from services.metrics import metrics
+
+class ResponseTooLarge(Exception):
+    pass
+
+class CachedHttpClient:
+    def __init__(self, max_entries=256, timeout=15, connections=10, headers=None):
+        self.max_entries = max_entries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.connections = connections
+        self.headers = headers or {}
+        self._session = None
+        # url -> (expires_at or None, value), kept in LRU order
+        self._cache = OrderedDict()
+        self._pending = {}
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.connections, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl):
+        self._cache[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, url):
+        session = await self.get_session()
+        name = f"http.{urlsplit(url).hostname}"
+        with metrics.timed(name):
+            async with session.get(url) as response:
+                if response.status != 200:
+                    metrics.record_error(name)
+                    return None
+                return await response.json(content_type=None)
+
+    async def get_json(self, url, ttl=None):
+        value = self._cached(url)
+        if value is not None:
+            return value
+        # Concurrent callers asking for the same URL share one request.
+        pending = self._pending.get(url)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(url))
+            self._pending[url] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(url, None))
+        try:
+            value = await asyncio.shield(pending)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # ValueError: a 200 whose body is not JSON, e.g. an HTML error page.
+            print(f"Request to {url} failed: {e}")
+            return None
+        if value is not None:
+            self._store(url, value, ttl)
+        return value
+
+    async def get_raw(self, url, headers=None, max_bytes=None):
+        # Uncached GET returning (status, headers, body); the body is read in
+        # chunks so oversized downloads are dropped before they are buffered.
+        session = await self.get_session()
+        with metrics.timed(f"http.{urlsplit(url).hostname}"):
+            async with session.get(url, headers=headers) as response:
+                if response.status != 200:
+                    return response.status, response.headers, None
+                if max_bytes is not None and (response.content_length or 0) > max_bytes:
+                    raise ResponseTooLarge(f"{url} is {response.content_length} bytes (limit {max_bytes})")
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body.extend(chunk)
+                    if max_bytes is not None and len(body) > max_bytes:
+                        raise ResponseTooLarge(f"{url} exceeds {max_bytes} bytes")
+                return response.status, response.headers, bytes(body)
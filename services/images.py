@@ -0,0 +1,136 @@
+import os
+import io
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from PIL import Image, UnidentifiedImageError
+from dotenv import load_dotenv
+from services.http_client import ResponseTooLarge
+from services.metrics import metrics
+
+load_dotenv()
+
+BANNER_CACHE_DIR = os.getenv("BANNER_CACHE_DIR", os.path.join(".cache", "banners"))
+BANNER_MAX_DOWNLOAD_BYTES = 8 * 1024 * 1024
+# Discord accepts uploads up to 10 MiB.
+BANNER_MAX_ENCODED_BYTES = 10 * 1024 * 1024
+# Scheduled event covers are shown at roughly 800x320, so anything larger is
+# only wasted upload time.
+BANNER_MAX_SIZE = (1600, 1600)
+BANNER_FRESH_SECONDS = 24 * 60 * 60
+# Banners and their .etag files together; the least recently used go first.
+BANNER_CACHE_MAX_FILES = int(os.getenv("BANNER_CACHE_MAX_FILES", "256"))
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="banner")
+
+def _url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+def _banner_file(digest):
+    return os.path.join(BANNER_CACHE_DIR, f"{digest}.png")
+
+def _etag_file(url):
+    return os.path.join(BANNER_CACHE_DIR, f"{_url_key(url)}.etag")
+
+def process_banner(data):
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", BANNER_MAX_SIZE)
+        image.thumbnail(BANNER_MAX_SIZE)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        with io.BytesIO() as image_binary:
+            image.save(image_binary, format="PNG", optimize=True)
+            encoded = image_binary.getvalue()
+    if len(encoded) > BANNER_MAX_ENCODED_BYTES:
+        raise ValueError(f"Encoded banner is {len(encoded)} bytes (limit {BANNER_MAX_ENCODED_BYTES})")
+    return encoded
+
+def _read_cached(url, max_age=None):
+    # Returns (etag, png bytes) for the last processed copy of url, if any.
+    try:
+        etag_path = _etag_file(url)
+        if max_age is not None and time.time() - os.path.getmtime(etag_path) > max_age:
+            return None, None
+        with open(etag_path) as f:
+            etag, digest = f.read().split("\n", 1)
+        banner_path = _banner_file(digest)
+        with open(banner_path, "rb") as f:
+            banner = f.read()
+        os.utime(banner_path)
+        return etag or None, banner
+    except (OSError, ValueError):
+        return None, None
+
+def _touch_cached(url):
+    try:
+        os.utime(_etag_file(url))
+    except OSError:
+        pass
+
+def _process_and_store(url, etag, data):
+    # Processed banners are stored under a digest of url + ETag (or of the
+    # raw bytes when the server sends no ETag), so a changed logo never
+    # reuses a stale file.
+    digest = hashlib.sha256(f"{url}\n{etag}".encode("utf-8") if etag else data).hexdigest()
+    path = _banner_file(digest)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            banner = f.read()
+    else:
+        banner = process_banner(data)
+        os.makedirs(BANNER_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(banner)
+        os.replace(tmp_path, path)
+    os.makedirs(BANNER_CACHE_DIR, exist_ok=True)
+    with open(_etag_file(url), "w") as f:
+        f.write(f"{etag or ''}\n{digest}")
+    _evict_cached()
+    return banner
+
+def _evict_cached():
+    # An .etag whose banner was evicted (or the reverse) just reads as a miss.
+    try:
+        entries = [entry for entry in os.scandir(BANNER_CACHE_DIR) if entry.name.endswith((".png", ".etag"))]
+    except OSError:
+        return
+    if len(entries) <= BANNER_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - BANNER_CACHE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+async def run_in_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+async def load_banner(http_client, url):
+    etag, banner = await run_in_pool(_read_cached, url, BANNER_FRESH_SECONDS)
+    if banner is not None:
+        return banner
+    etag, banner = await run_in_pool(_read_cached, url)
+    headers = {"If-None-Match": etag} if etag and banner is not None else None
+    try:
+        status, response_headers, data = await http_client.get_raw(url, headers=headers, max_bytes=BANNER_MAX_DOWNLOAD_BYTES)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ResponseTooLarge) as e:
+        print(f"Failed to download banner {url}: {e}")
+        return banner
+    if status == 304 and banner is not None:
+        await run_in_pool(_touch_cached, url)
+        return banner
+    if data is None:
+        print(f"Failed to download banner {url}: HTTP {status}")
+        return banner
+    try:
+        # Timed here rather than in the pool thread: Metrics is only ever
+        # touched from the event loop.
+        with metrics.timed("image.process"):
+            return await run_in_pool(_process_and_store, url, response_headers.get("ETag"), data)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        print(f"Failed to process banner {url}: {e}")
+        return banner
@@ -0,0 +1,118 @@
+import time
+import asyncio
+import itertools
+from services.metrics import metrics
+
+class Job:
+    def __init__(self, job_id, key, description, factory):
+        self.id = job_id
+        self.key = key
+        self.description = description
+        self.factory = factory
+        self.status = "queued"
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def kind(self):
+        return self.key[0] if isinstance(self.key, tuple) else self.key
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def elapsed(self):
+        start = self.started_at or self.created_at
+        return (self.finished_at or time.monotonic()) - start
+
+class JobQueue:
+    # In-process background jobs with a fixed number of workers. A job key
+    # (e.g. ("writeup", channel_id)) can only be queued or running once.
+    def __init__(self, workers=2, history=20):
+        self.workers = workers
+        self.history = history
+        self._ids = itertools.count(1)
+        self._queue = None
+        self._worker_tasks = []
+        self._active = {}
+        self._finished = []
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    def submit(self, key, description, factory):
+        # Returns (job, created); when the key is already active the existing
+        # job is returned and nothing new is queued.
+        existing = self._active.get(key)
+        if existing is not None:
+            return existing, False
+        job = Job(next(self._ids), key, description, factory)
+        self._active[key] = job
+        self._ensure_workers()
+        self._queue.put_nowait(job)
+        return job, True
+
+    def get(self, job_id):
+        for job in self.jobs():
+            if job.id == job_id:
+                return job
+        return None
+
+    def jobs(self):
+        return list(self._active.values()) + self._finished[::-1]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            self._finish(job, "cancelled")
+        return True
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.monotonic()
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+        self._finished.append(job)
+        del self._finished[:-self.history]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.started_at = time.monotonic()
+            job.task = asyncio.create_task(job.factory())
+            try:
+                await asyncio.shield(job.task)
+                self._finish(job, "done")
+                metrics.observe(f"job.{job.kind}", job.elapsed())
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    # The worker itself is being shut down.
+                    job.task.cancel()
+                    self._finish(job, "cancelled")
+                    raise
+                self._finish(job, "cancelled")
+            except Exception as e:
+                print(f"Job {job.id} ({job.description}) failed: {e}")
+                self._finish(job, "failed")
+                metrics.observe(f"job.{job.kind}", job.elapsed(), error=True)
+
+    async def close(self):
+        for job in list(self._active.values()):
+            self.cancel(job.id)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
@@ -0,0 +1,98 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from aiohttp import web
+
+class Metrics:
+    # In-process latency and error tracking. Each metric keeps its last
+    # `window` samples, which is enough for p50/p95 without unbounded growth.
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}
+        self.calls = {}
+        self.totals = {}
+        self.errors = {}
+        self.github_rate_limit = {}
+
+    def observe(self, name, seconds, error=False):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        if error:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - start, error=True)
+            raise
+        self.observe(name, time.perf_counter() - start)
+
+    def record_error(self, name):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def record_github_rate_limit(self, headers):
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        self.github_rate_limit = {
+            "limit": int(headers.get("X-RateLimit-Limit", 0)),
+            "remaining": int(headers["X-RateLimit-Remaining"]),
+            "reset": int(headers.get("X-RateLimit-Reset", 0))
+        }
+
+    def summary(self):
+        # [(name, calls, errors, p50, p95)] sorted by name, latencies in seconds.
+        rows = []
+        for name in sorted(self.samples):
+            ordered = sorted(self.samples[name])
+            rows.append((
+                name,
+                self.calls[name],
+                self.errors.get(name, 0),
+                percentile(ordered, 0.50),
+                percentile(ordered, 0.95)
+            ))
+        return rows
+
+    def prometheus_text(self):
+        lines = [
+            "# TYPE bot_latency_seconds summary",
+            "# TYPE bot_errors_total counter"
+        ]
+        for name, calls, errors, p50, p95 in self.summary():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'bot_latency_seconds{{name="{label}",quantile="0.5"}} {p50:.6f}')
+            lines.append(f'bot_latency_seconds{{name="{label}",quantile="0.95"}} {p95:.6f}')
+            lines.append(f'bot_latency_seconds_sum{{name="{label}"}} {self.totals[name]:.6f}')
+            lines.append(f'bot_latency_seconds_count{{name="{label}"}} {calls}')
+            lines.append(f'bot_errors_total{{name="{label}"}} {errors}')
+        if self.github_rate_limit:
+            lines.append("# TYPE bot_github_rate_limit_remaining gauge")
+            lines.append(f"bot_github_rate_limit_remaining {self.github_rate_limit['remaining']}")
+            lines.append("# TYPE bot_github_rate_limit_limit gauge")
+            lines.append(f"bot_github_rate_limit_limit {self.github_rate_limit['limit']}")
+        return "\n".join(lines) + "\n"
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def start_metrics_server(metrics, port, host="127.0.0.1"):
+    async def handle(request):
+        return web.Response(text=metrics.prometheus_text(), content_type="text/plain", charset="utf-8")
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
+
+metrics = Metrics()
@@ -0,0 +1,50 @@
+import time
+import asyncio
+import discord
+
+class ProgressMessage:
+    # A single status message that is edited in place. Updates are coalesced
+    # so at most one edit is sent per interval, whatever the update rate.
+    def __init__(self, channel, interval=2.0):
+        self.channel = channel
+        self.interval = interval
+        self.message = None
+        self._text = None
+        self._shown = None
+        self._last_edit = 0.0
+        self._pending = None
+
+    async def start(self, text):
+        self.message = await self.channel.send(text)
+        self._text = self._shown = text
+        self._last_edit = time.monotonic()
+
+    def update(self, text):
+        self._text = text
+        if self.message is not None and self._pending is None and text != self._shown:
+            self._pending = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(max(0.0, self._last_edit + self.interval - time.monotonic()))
+            await self._edit(self._text)
+        finally:
+            self._pending = None
+
+    async def _edit(self, text):
+        if text == self._shown:
+            return
+        self._shown = text
+        self._last_edit = time.monotonic()
+        try:
+            await self.message.edit(content=text)
+        except discord.HTTPException as e:
+            print(f"Failed to update progress message: {e}")
+
+    async def finish(self, text):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        self._text = text
+        if self.message is not None:
+            await self._edit(text)
@@ -0,0 +1,103 @@
+import heapq
+import asyncio
+import itertools
+from datetime import datetime, timezone
+
+# Never sleep longer than this in one go, so wall-clock jumps (suspend, NTP)
+# are noticed within a bounded time.
+MAX_SLEEP_SECONDS = 60 * 60
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+class Scheduler:
+    # Runs coroutine callbacks at absolute times. Each job has a key; scheduling
+    # the same key again replaces the earlier entry. The clock is injectable so
+    # callers can drive it in tests.
+    def __init__(self, clock=utc_now):
+        self.clock = clock
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._wake = None
+        self._runner = None
+        self._running = set()
+
+    def schedule_at(self, key, when, callback, *args):
+        self.cancel(key)
+        entry = [when, next(self._seq), key, callback, args]
+        self._jobs[key] = entry
+        heapq.heappush(self._heap, entry)
+        self.wake()
+
+    def cancel(self, key):
+        entry = self._jobs.pop(key, None)
+        if entry is not None:
+            entry[3] = None
+
+    def is_scheduled(self, key):
+        return key in self._jobs
+
+    def scheduled(self):
+        return sorted(((entry[0], key) for key, entry in self._jobs.items()), key=lambda item: item[0])
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        # Safe to call again (e.g. from every on_ready); only one runner exists.
+        if self._runner is None or self._runner.done():
+            self._wake = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+        return self._runner
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    def next_delay(self):
+        while self._heap and self._heap[0][3] is None:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return (self._heap[0][0] - self.clock()).total_seconds()
+
+    def run_due(self):
+        # Starts every job whose time has come and returns their tasks.
+        now = self.clock()
+        tasks = []
+        while self._heap and (self._heap[0][3] is None or self._heap[0][0] <= now):
+            when, _, key, callback, args = heapq.heappop(self._heap)
+            if callback is None:
+                continue
+            del self._jobs[key]
+            task = asyncio.create_task(self._call(key, callback, args))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            tasks.append(task)
+        return tasks
+
+    async def _call(self, key, callback, args):
+        try:
+            await callback(*args)
+        except Exception as e:
+            print(f"Scheduled job {key} failed: {e}")
+
+    async def _run(self):
+        while True:
+            self.run_due()
+            delay = self.next_delay()
+            self._wake.clear()
+            if delay is not None and delay <= 0:
+                continue
+            timeout = MAX_SLEEP_SECONDS if delay is None else min(delay, MAX_SLEEP_SECONDS)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -1,8 +1,12 @@
 import os
-import requests
-import base64
-from datetime import datetime
+import json
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import aiohttp
 from dotenv import load_dotenv
+from services.metrics import metrics
 
 load_dotenv()
 
@@ -10,7 +14,22 @@ GITHUB_REPO_OWNER = os.getenv("GITHUB_REPO_OWNER")
 GITHUB_REPO_NAME = os.getenv("GITHUB_REPO_NAME")
 GITHUB_PAT = os.getenv("GITHUB_PAT")
 PARENT_FOLDER = os.getenv("PARENT_FOLDER")
-GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}/contents"
+GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com")
+GITHUB_REPO_API_URL = f"{GITHUB_API_BASE}/repos/{GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}"
+GITHUB_API_URL = f"{GITHUB_REPO_API_URL}/contents"
+GITHUB_BRANCH = os.getenv("GITHUB_BRANCH", "main")
+GITHUB_MAX_CONCURRENCY = int(os.getenv("GITHUB_MAX_CONCURRENCY", "4"))
+GITHUB_TIMEOUT = 30
+GITHUB_MAX_RETRIES = 3
+
+_session = None
+# Reads may run in parallel, but commits all move the same branch head, so
+# they are serialized to avoid losing the race on the ref update.
+_request_slots = asyncio.Semaphore(GITHUB_MAX_CONCURRENCY)
+_write_lock = asyncio.Lock()
+
+class GitHubError(Exception):
+    pass
 
 def safe_join(base, *paths):
     joined = os.path.join(base, *paths)
@@ -19,70 +38,133 @@ def safe_join(base, *paths):
         raise ValueError("Path traversal detected")
     return normalized
 
-def create_folder_structure(ctf, category, challenge_name, content, sender_username):
-    headers = {
-        "Authorization": f"token {GITHUB_PAT}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    content_with_author = f"{content}\n\nSolved by: {sender_username}"
-    parent_path = PARENT_FOLDER
-    create_folder_on_github(parent_path, headers)
-    current_year = str(datetime.now().year)
-    challenge_path = safe_join(parent_path, current_year, ctf)
-    create_folder_on_github(challenge_path, headers)
-    writeup_file = f"{category}-{challenge_name}.md"
-    writeup_path = safe_join(challenge_path, writeup_file)
-    response = requests.get(f"{GITHUB_API_URL}/{writeup_path}", headers=headers)
-    if response.status_code == 200:
-        existing_file = response.json()
-        existing_content = base64.b64decode(existing_file["content"]).decode("utf-8")
-        sha = existing_file["sha"]
-        if existing_content.strip() == content_with_author.strip():
-            print(f"File {writeup_path} already exists and content is identical. Skipping.")
-            return "exist"
-        else:
-            print(f"File {writeup_path} exists but content has changed. Updating...")
-            update_file_on_github(writeup_path, content_with_author, sha, headers)
-            return "updated"
-    else:
-        print(f"File {writeup_path} does not exist. Creating...")
-        upload_file_to_github(writeup_path, content_with_author, headers)
+async def get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            headers={
+                "Authorization": f"token {GITHUB_PAT}",
+                "Accept": "application/vnd.github.v3+json"
+            },
+            connector=aiohttp.TCPConnector(limit=GITHUB_MAX_CONCURRENCY, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=GITHUB_TIMEOUT)
+        )
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def retry_after_seconds(value):
+    # Retry-After is either a number of seconds or an HTTP date.
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+async def github_request(method, url, **kwargs):
+    session = await get_session()
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        async with _request_slots:
+            with metrics.timed(f"github.{method}"):
+                async with session.request(method, url, **kwargs) as response:
+                    metrics.record_github_rate_limit(response.headers)
+                    text = await response.text()
+                    try:
+                        body = json.loads(text) if text else None
+                    except ValueError:
+                        body = text
+                    # Primary and secondary rate limits answer 429/403 with
+                    # Retry-After; those are only errors once out of retries.
+                    retry_after = response.headers.get("Retry-After")
+                    delay = retry_after_seconds(retry_after) if retry_after is not None else None
+                    retry = response.status in (403, 429) and delay is not None and attempt < GITHUB_MAX_RETRIES
+                    if response.status >= 400 and response.status not in (404, 422) and not retry:
+                        metrics.record_error(f"github.{method}")
+        # Wait outside the request slot so other calls can proceed.
+        if retry:
+            print(f"GitHub rate limited {method} {url}, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            continue
+        return response.status, body
+
+def writeup_path(year, ctf, category, challenge_name):
+    challenge_path = safe_join(PARENT_FOLDER, str(year), ctf)
+    return safe_join(challenge_path, f"{category}-{challenge_name}.md")
+
+def git_blob_sha(file_content):
+    data = file_content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+async def list_folder_blobs(folder_path):
+    status, body = await github_request("GET", f"{GITHUB_API_URL}/{folder_path}", params={"ref": GITHUB_BRANCH})
+    if status == 404:
+        return {}
+    if status != 200:
+        raise GitHubError(f"Failed to list {folder_path}: {status} - {body}")
+    return {entry["path"]: entry["sha"] for entry in body if entry["type"] == "file"}
+
+async def commit_files(blobs, message, retries=3):
+    # blobs: {path: blob_sha}. The blobs already exist, so a retry after the
+    # branch moved only rebuilds the tree and commit.
+    ref_url = f"{GITHUB_REPO_API_URL}/git/refs/heads/{GITHUB_BRANCH}"
+    tree = [{"path": path, "mode": "100644", "type": "blob", "sha": sha} for path, sha in blobs.items()]
+    async with _write_lock:
+        for _ in range(retries):
+            status, ref = await github_request("GET", ref_url)
+            if status != 200:
+                raise GitHubError(f"Failed to read branch {GITHUB_BRANCH}: {status} - {ref}")
+            head_sha = ref["object"]["sha"]
+            status, head = await github_request("GET", f"{GITHUB_REPO_API_URL}/git/commits/{head_sha}")
+            if status != 200:
+                raise GitHubError(f"Failed to read commit {head_sha}: {status} - {head}")
+            status, new_tree = await github_request("POST", f"{GITHUB_REPO_API_URL}/git/trees", json={"base_tree": head["tree"]["sha"], "tree": tree})
+            if status != 201:
+                raise GitHubError(f"Failed to create tree: {status} - {new_tree}")
+            status, commit = await github_request("POST", f"{GITHUB_REPO_API_URL}/git/commits", json={"message": message, "tree": new_tree["sha"], "parents": [head_sha]})
+            if status != 201:
+                raise GitHubError(f"Failed to create commit: {status} - {commit}")
+            status, body = await github_request("PATCH", ref_url, json={"sha": commit["sha"]})
+            if status == 200:
+                print(f"Committed {len(blobs)} file(s) to {GITHUB_BRANCH}: {commit['sha']}")
+                return commit["sha"]
+            if status != 422:
+                raise GitHubError(f"Failed to update branch {GITHUB_BRANCH}: {status} - {body}")
+            # The branch moved while we were building the commit; rebuild on the new head.
+            print(f"Branch {GITHUB_BRANCH} moved during commit, retrying...")
+    raise GitHubError(f"Failed to update branch {GITHUB_BRANCH} after {retries} attempts")
+
+def writeup_file_content(content, sender_username):
+    return f"{content}\n\nSolved by: {sender_username}"
+
+async def list_writeup_blobs(year, ctf):
+    return await list_folder_blobs(safe_join(PARENT_FOLDER, str(year), ctf))
+
+def writeup_status(path, file_content, existing):
+    # existing: {path: blob_sha} from list_writeup_blobs.
+    if path not in existing:
         return "created"
+    return "exist" if existing[path] == git_blob_sha(file_content) else "updated"
+
+async def create_blob(file_content):
+    status, body = await github_request("POST", f"{GITHUB_REPO_API_URL}/git/blobs", json={"content": file_content, "encoding": "utf-8"})
+    if status != 201:
+        raise GitHubError(f"Failed to create blob: {status} - {body}")
+    return body["sha"]
+
+async def commit_writeups(ctf, blobs, results):
+    # blobs: {path: blob_sha} uploaded during the run, committed as one tree.
+    created = sum(1 for path in blobs if results[path] == "created")
+    return await commit_files(blobs, f"Writeups for {ctf}: {created} added, {len(blobs) - created} updated")
 
-def create_folder_on_github(folder_path, headers):
-    placeholder_file = f"{folder_path}/.gitkeep"
-    data = {
-        "message": f"Create folder: {folder_path}",
-        "content": "",
-        "branch": "main"
-    }
-    response = requests.put(f"{GITHUB_API_URL}/{placeholder_file}", json=data, headers=headers)
-    if response.status_code not in [201, 422]:
-        print(f"Failed to create folder {folder_path}: {response.status_code} - {response.text}")
-
-def upload_file_to_github(file_path, file_content, headers):
-    encoded_content = file_content.encode("utf-8")
-    data = {
-        "message": f"Add file: {file_path}",
-        "content": base64.b64encode(encoded_content).decode("utf-8"),
-        "branch": "main"
-    }
-    response = requests.put(f"{GITHUB_API_URL}/{file_path}", json=data, headers=headers)
-    if response.status_code == 201:
-        print(f"File uploaded successfully: {file_path}")
-    else:
-        print(f"Failed to upload file {file_path}: {response.status_code} - {response.text}")
-
-def update_file_on_github(file_path, file_content, sha, headers):
-    encoded_content = base64.b64encode(file_content.encode("utf-8")).decode("utf-8")
-    data = {
-        "message": f"Update file: {file_path}",
-        "content": encoded_content,
-        "sha": sha,
-        "branch": "main"
-    }
-    response = requests.put(f"{GITHUB_API_URL}/{file_path}", json=data, headers=headers)
-    if response.status_code == 200:
-        print(f"File updated successfully: {file_path}")
-    else:
-        print(f"Failed to update file {file_path}: {response.status_code} - {response.text}")
+def github_file_url(path):
+    return f"https://github.com/{GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}/blob/{GITHUB_BRANCH}/{path}"
@@ -0,0 +1,131 @@
+import re
+from collections import namedtuple
+from itertools import chain
+
+# A writeup is a block of text between `---` lines with a short header:
+#
+#   ---
+#   Category: web
+#   Challenge Name: Baby SQLi
+#
+#   <markdown content>
+#   ---
+#
+# One message (or .md attachment) can carry several blocks. `---` lines inside
+# ``` / ~~~ fences are content, so fenced examples never open or close a block.
+#
+# The text is scanned once, line by line, with LINE_TOKEN. It only matches the
+# lines the parser cares about (`---`, fences, header fields and blank lines),
+# so other lines never reach Python and the content is sliced out of the
+# original text. Every token has exactly one way to match, so a scan is linear
+# in the length of the text whatever it contains.
+
+Writeup = namedtuple("Writeup", "category challenge_name content")
+WriteupError = namedtuple("WriteupError", "line message")
+# The lines after a `---`, up to the first blank line; a bare file starts with
+# an implicit one. first is set for a `---` that starts the text.
+Header = namedtuple("Header", "pos fields implicit first")
+# An open writeup. content_start is None when its header ran straight into the
+# content; header_end is where the header stopped.
+Block = namedtuple("Block", "pos fields content_start header_end implicit")
+
+NON_ALNUM = re.compile(r"[^a-z0-9]")
+DELIMITER = re.compile(r"^[ \t]*-{3,}[ \t\r]*$", re.M)
+LINE_TOKEN = re.compile(
+    r"^[ \t]*(?:"
+    r"(?P<delimiter>-{3,})[ \t]*$"
+    r"|(?P<fence>```|~~~)"
+    r"|(?P<field>(?P<key>(?i:category|challenge[ \t]+name))[ \t]*:(?P<value>[^\n]*))"
+    r"|(?P<blank>)$"
+    r")",
+    re.M
+)
+
+def normalize_name(text):
+    return NON_ALNUM.sub("", text.lower())
+
+def looks_like_writeup(text):
+    return "---" in text and DELIMITER.search(text) is not None
+
+def line_number(text, pos):
+    return text.count("\n", 0, pos) + 1
+
+def missing_fields(category, challenge_name):
+    missing = [label for label, value in (("Category", category), ("Challenge Name", challenge_name)) if not value]
+    return " and ".join(missing)
+
+def finish_block(text, block, end, writeups, errors):
+    # end is the start of the line that closes the block.
+    category = block.fields.get("category")
+    challenge_name = block.fields.get("challenge name")
+    if not category or not challenge_name:
+        errors.append(WriteupError(line_number(text, block.pos), f"missing {missing_fields(category, challenge_name)}"))
+    elif block.content_start is None:
+        errors.append(WriteupError(line_number(text, block.header_end), "expected a blank line between the header and the content"))
+    else:
+        category, challenge_name = normalize_name(category), normalize_name(challenge_name)
+        if not category or not challenge_name:
+            errors.append(WriteupError(line_number(text, block.pos), "Category and Challenge Name need at least one letter or digit"))
+            return
+        content = text[block.content_start:end - 1] if end > block.content_start else ""
+        writeups.append(Writeup(category, challenge_name, content))
+
+def parse_writeups(text, bare=False):
+    # Returns ([Writeup], [WriteupError]). A broken block is reported with its
+    # line number and does not stop the blocks after it from being parsed.
+    # With bare=True the text may also be a single block without the `---`
+    # lines around it, which is how writeups usually look as .md files.
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    writeups = []
+    errors = []
+    first_char = len(text) - len(text.lstrip())
+    fence = None
+    header = Header(0, {}, True, False) if bare else None
+    # block: the writeup currently open; close: the last plain `---` since.
+    block = None
+    close = None
+    # A final None stands for the end of the text, which ends a pending header.
+    for match in chain(LINE_TOKEN.finditer(text), (None,)):
+        kind = match.lastgroup if match is not None else None
+        pos = match.start() if match is not None else len(text)
+        if header is not None:
+            if kind == "field":
+                header.fields[" ".join(match.group("key").lower().split())] = match.group("value").strip(" \t")
+                continue
+            # A header with a field, or a `---` that starts the text, opens a
+            # block; any other `---` may be the one that closes the open block.
+            if header.fields or header.first:
+                if block is not None:
+                    # A single `---` between two writeups closes one and opens the next.
+                    finish_block(text, block, close if close is not None else header.pos, writeups, errors)
+                content_start = match.end() + 1 if kind == "blank" else None
+                block = Block(header.pos, header.fields, content_start, pos, header.implicit)
+                close = None
+            elif not header.implicit:
+                close = header.pos
+            header = None
+            if kind == "blank":
+                continue
+        if kind == "fence":
+            marker = match.group("fence")
+            if fence is None:
+                fence = marker
+            elif fence == marker:
+                fence = None
+        elif kind == "delimiter" and fence is None:
+            header = Header(pos, {}, False, pos <= first_char)
+    if block is not None:
+        if bare and block.implicit and close is not None:
+            # A `---` in the middle of a bare file is a horizontal rule; only
+            # one on the last line closes the writeup.
+            newline = text.find("\n", close)
+            if newline != -1 and text[newline:].strip():
+                close = None
+        if close is not None:
+            finish_block(text, block, close, writeups, errors)
+        elif bare:
+            finish_block(text, block, len(text.rstrip()) + 1, writeups, errors)
+        elif block.fields:
+            errors.append(WriteupError(line_number(text, block.pos), "missing closing `---`"))
+    return writeups, errors